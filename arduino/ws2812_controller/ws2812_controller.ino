@@ -19,6 +19,10 @@ IPAddress gateway(192, 168, 1, 1);
 IPAddress subnet(255, 255, 255, 0);
 
 const int udp_port = 7778;
+// Boards synced with others of the same length can also take frames sent once to a
+// multicast group, set "multicast" to the same address for them in config.json
+const bool multicast = false;
+IPAddress multicast_group(239, 255, 0, 1);
 
 /*********************************** FastLED Defintions ********************************/
 #define NUM_LEDS      250
@@ -27,9 +31,52 @@ const int udp_port = 7778;
 #define CHIPSET       WS2812B
 #define COLOR_ORDER   GRB
 
+/*********************************** Packet Format *************************************/
+// Either a raw frame of exactly sizeof(leds) bytes, or a packet with the header
+//   |magic|type|frame|offset (2, little endian)|count (2, little endian)|
+// followed by, for TYPE_RGB, count r,g,b triplets for LEDs offset..offset+count-1,
+// or for TYPE_DELTA, runs of |start (2, little endian)|length|length r,g,b triplets|
+// for the LEDs in that range that changed, or for TYPE_RLE, runs of |length|r|g|b|
+// covering the range, or for TYPE_PALETTE, |n|n r,g,b triplets|count indices|.
+// RLE and palette packets may end with a byte of padding. The packets of a frame cover consecutive
+// LEDs and the last one has FLAG_LAST set. With FLAG_TIMED also set the header
+// is followed by |seq (2)|pts (4)|, and the frame is dropped if it is older than
+// one already received or otherwise shown once micros() reaches pts. MAX_STALE
+// such frames in a row mean the sender restarted its numbering, so it is followed. TYPE_PING
+// packets carry |t0 (4)|0 (4)| and are answered with a TYPE_PONG carrying t0 and
+// micros(), so the sender can work out pts. See python/lib/packets.py for the
+// sending side.
+#define PACKET_MAGIC  0xD1
+#define HEADER_SIZE   7
+#define TIMED_SIZE    6
+#define CLOCK_SIZE    8
+#define TYPE_RGB      0x01
+#define TYPE_DELTA    0x02
+#define TYPE_RLE      0x03
+#define TYPE_PALETTE  0x04
+#define TYPE_PING     0x05
+#define TYPE_PONG     0x06
+#define RUN_SIZE      3
+#define FLAG_LAST     0x80
+#define FLAG_TIMED    0x40
+#define TYPE_MASK     0x3F
+#define MAX_PACKET    1472
+#define MAX_PENDING   4     // Timed frames held waiting for their time
+#define MAX_STALE     8     // Timed frames dropped in a row as old before following the sender's new numbering
+
 /*********************************** Globals *******************************************/
 WiFiUDP port;
-CRGB leds[NUM_LEDS];
+CRGB leds[NUM_LEDS];        // What the strip is showing
+CRGB received[NUM_LEDS];    // Frame being assembled from packets
+uint8_t packet[MAX_PACKET];
+int currentFrame = -1;      // Id of the frame being assembled from headed packets
+uint16_t ledsReceived = 0;  // LEDs of that frame received so far
+int32_t lastSeq = -1;       // Sequence number of the last complete timed frame
+uint8_t staleFrames = 0;    // Timed frames dropped in a row for being older than lastSeq
+CRGB pendingLeds[MAX_PENDING][NUM_LEDS];  // Complete timed frames, a ring oldest first
+uint32_t pendingAt[MAX_PENDING];
+uint8_t pendingFirst = 0;
+uint8_t pendingCount = 0;
 
 /********************************** Start Setup ****************************************/
 void setup() {
@@ -48,8 +95,12 @@ void setup() {
   // Setup OTA firmware updates
   setup_ota();
 
-  // Initialize the UDP port
-  port.begin(udp_port);
+  // Initialize the UDP port, joining the group still takes unicast on the same port
+  if (multicast) {
+    port.beginMulticast(WiFi.localIP(), multicast_group, udp_port);
+  } else {
+    port.begin(udp_port);
+  }
 }
 
 void setup_wifi() {
@@ -118,14 +169,190 @@ void loop() {
   // will also give the ability to have some non-reative effects to
   // be driven completely locally making them less glitchy.
 
+  show_due();
+
   // Handle UDP data
   int packetSize = port.parsePacket();
   if (packetSize == sizeof(leds)) {
-    port.read((char*)leds, sizeof(leds));
-    FastLED.show();
+    port.read((char*)received, sizeof(received));
+    currentFrame = -1;
+    show_frame(received);
+  } else if (packetSize >= HEADER_SIZE && packetSize <= MAX_PACKET) {
+    port.read((char*)packet, packetSize);
+    handle_packet(packetSize);
   } else if (packetSize) {
     Serial.printf("Invalid packet size: %u (expected %u)\n", packetSize, sizeof(leds));
     port.flush();
     return;
   }
+}
+
+void handle_packet(int packetSize) {
+  // Checked first so stray datagrams never count as stale frames
+  if (packet[0] != PACKET_MAGIC) {
+    Serial.printf("Invalid packet (magic %u, size %u)\n", packet[0], packetSize);
+    return;
+  }
+  uint8_t type = packet[1];
+  uint8_t frame = packet[2];
+  uint16_t offset = packet[3] | (packet[4] << 8);
+  uint16_t count = packet[5] | (packet[6] << 8);
+  if ((type & TYPE_MASK) == TYPE_PING && packetSize >= HEADER_SIZE + CLOCK_SIZE) {
+    reply_ping();
+    return;
+  }
+  int start = HEADER_SIZE;
+  uint16_t seq = 0;
+  uint32_t pts = 0;
+  if (type & FLAG_TIMED) {
+    start += TIMED_SIZE;
+    seq = packet[7] | (packet[8] << 8);
+    pts = read_uint32(packet + 9);
+    // Older than a frame already complete, it was reordered or held up on the way
+    if (packetSize >= start && lastSeq >= 0 && (int16_t)(seq - lastSeq) <= 0) {
+      if ((type & FLAG_LAST) && ++staleFrames >= MAX_STALE) {
+        lastSeq = -1;
+        staleFrames = 0;
+      }
+      return;
+    }
+  }
+  if (packetSize < start || offset + count > NUM_LEDS || !decode_packet(type & TYPE_MASK, offset, count, packet + start, packetSize - start)) {
+    Serial.printf("Invalid packet (type %u, offset %u, count %u, size %u)\n", type, offset, count, packetSize);
+    return;
+  }
+  if (frame != currentFrame) {
+    currentFrame = frame;
+    ledsReceived = 0;
+  }
+  ledsReceived += count;
+  if (type & FLAG_LAST) {
+    // Only show whole frames, if a packet went missing the next frame overwrites what did arrive
+    if (ledsReceived == offset + count) {
+      if (type & FLAG_TIMED) {
+        lastSeq = seq;
+        staleFrames = 0;
+        queue_frame(pts);
+      } else {
+        show_frame(received);
+      }
+    }
+    currentFrame = -1;
+    ledsReceived = 0;
+  }
+}
+
+uint32_t read_uint32(uint8_t *bytes) {
+  return bytes[0] | (bytes[1] << 8) | (bytes[2] << 16) | ((uint32_t)bytes[3] << 24);
+}
+
+void show_frame(CRGB *frame) {
+  if (frame != leds) {
+    memcpy(leds, frame, sizeof(leds));
+  }
+  FastLED.show();
+}
+
+void queue_frame(uint32_t pts) {
+  if ((int32_t)(micros() - pts) >= 0) {
+    // Already late, and anything still waiting is older
+    pendingCount = 0;
+    show_frame(received);
+    return;
+  }
+  if (pendingCount == MAX_PENDING) {
+    pendingFirst = (pendingFirst + 1) % MAX_PENDING;
+    pendingCount--;
+  }
+  uint8_t slot = (pendingFirst + pendingCount) % MAX_PENDING;
+  memcpy(pendingLeds[slot], received, sizeof(received));
+  pendingAt[slot] = pts;
+  pendingCount++;
+}
+
+void show_due() {
+  // Show the newest frame whose time has come, any older due ones are skipped
+  int due = -1;
+  while (pendingCount && (int32_t)(micros() - pendingAt[pendingFirst]) >= 0) {
+    due = pendingFirst;
+    pendingFirst = (pendingFirst + 1) % MAX_PENDING;
+    pendingCount--;
+  }
+  if (due >= 0) {
+    show_frame(pendingLeds[due]);
+  }
+}
+
+void reply_ping() {
+  uint8_t reply[HEADER_SIZE + CLOCK_SIZE + 1] = {PACKET_MAGIC, TYPE_PONG | FLAG_LAST};
+  memcpy(reply + HEADER_SIZE, packet + HEADER_SIZE, 4);
+  uint32_t now = micros();
+  memcpy(reply + HEADER_SIZE + 4, &now, 4);
+  // The padding byte keeps it from being a multiple of 3 bytes long
+  port.beginPacket(port.remoteIP(), port.remotePort());
+  port.write(reply, sizeof(reply));
+  port.endPacket();
+}
+
+bool decode_packet(uint8_t type, uint16_t offset, uint16_t count, uint8_t *payload, int payloadSize) {
+  if (type == TYPE_RGB) {
+    if (payloadSize != count * 3) {
+      return false;
+    }
+    memcpy((uint8_t*)(received + offset), payload, payloadSize);
+    return true;
+  }
+  if (type == TYPE_DELTA) {
+    int position = 0;
+    while (position < payloadSize) {
+      if (position + RUN_SIZE > payloadSize) {
+        return false;
+      }
+      uint16_t start = payload[position] | (payload[position + 1] << 8);
+      uint8_t length = payload[position + 2];
+      position += RUN_SIZE;
+      if (start < offset || start + length > offset + count || position + length * 3 > payloadSize) {
+        return false;
+      }
+      memcpy((uint8_t*)(received + start), payload + position, length * 3);
+      position += length * 3;
+    }
+    return true;
+  }
+  if (type == TYPE_RLE) {
+    int runs = payloadSize / 4;
+    if (payloadSize - runs * 4 > 1) {
+      return false;
+    }
+    uint16_t led = offset;
+    for (int i = 0; i < runs; i++) {
+      uint8_t *run = payload + i * 4;
+      if (led + run[0] > offset + count) {
+        return false;
+      }
+      fill_solid(received + led, run[0], CRGB(run[1], run[2], run[3]));
+      led += run[0];
+    }
+    return led == offset + count;
+  }
+  if (type == TYPE_PALETTE) {
+    if (payloadSize < 1) {
+      return false;
+    }
+    uint8_t n = payload[0];
+    int indicesSize = payloadSize - 1 - n * 3;
+    if (indicesSize != count && indicesSize != count + 1) {
+      return false;
+    }
+    CRGB *palette = (CRGB*)(payload + 1);
+    uint8_t *indices = payload + 1 + n * 3;
+    for (uint16_t i = 0; i < count; i++) {
+      if (indices[i] >= n) {
+        return false;
+      }
+      received[offset + i] = palette[indices[i]];
+    }
+    return true;
+  }
+  return false;
 }
\ No newline at end of file
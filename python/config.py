@@ -94,8 +94,25 @@ with open("config.json") as configFile:
     devices[device["name"]] = {
         "configuration": {
           "TYPE": device["type"],
-          "UDP_IP": device["ip"],
-          "UDP_PORT": device["port"],
+          "UDP_IP": device.get("ip"),
+          "UDP_PORT": device.get("port"),
+          "PROTOCOL": device.get("protocol", "raw"),     # "chunked" for strips too long for one datagram, "compressed" or "delta" to send fewer bytes
+          "KEYFRAME_INTERVAL": device.get("keyframe_interval", 60),  # Frames between full frames with the delta protocol
+          "SKIP_THRESHOLD": device.get("skip_threshold", 0),         # Skip frames where no channel changed by more than this
+          "REFRESH_INTERVAL": device.get("refresh_interval", 1.0),   # Seconds before a skipped frame is sent anyway
+          "MAX_FPS": device.get("max_fps", 50),                      # Most frames per second sent to an ESP8266, E131 or ArtNet board with "async" or "staggered" output, None for no limit.
+                                                                     # FastLED's show() takes 9 ms for 300 LEDs, frames faster than the board can show only cost airtime
+          "TIMED": device.get("timed", False),                       # Stamp frames with when to show them, needs a protocol other than "raw"
+          "MULTICAST": device.get("multicast", None),                # Multicast group "address" or "address:port" synced ESP8266s of the same length share,
+                                                                     # their firmware has to join it. None sends to the board alone
+          "LED_PIN": device.get("led_pin", 10),                      # RaspberryPi only, see device_req_config
+          "LED_FREQ_HZ": device.get("led_freq_hz", 800000),
+          "LED_DMA": device.get("led_dma", 5),
+          "LED_INVERT": device.get("led_invert", True),
+          "SERVER": device.get("server", "localhost:7890"),          # Fadecandy only
+          "CHANNEL": device.get("channel", 0),
+          "UNIVERSE": device.get("universe", 1),                     # E131 and ArtNet only, first DMX universe of the strip
+          "SYNC_UNIVERSE": device.get("sync_universe", 0),           # Universe of sync packets so all universes change at once, 0 for none
           "maxBrightness": 255, 
           "N_PIXELS": device["leds"],
           "N_FFT_BINS": 24,
@@ -119,8 +136,19 @@ settings = {                                                      # All settings
       'MIC_RATE': 48000, 
       'FPS': 60,                                   # Desired refresh rate of the visualization (frames per second)
       'maxBrightness': 255,                        # Max brightness sent to LED strip
+      'GAMMA': 2.2,                                # Gamma correction exponent for devices with SOFTWARE_GAMMA_CORRECTION
       'N_ROLLING_HISTORY': 1,                      # Number of past audio frames to include in the rolling window
       'MIN_VOLUME_THRESHOLD': 0.001,               # No music visualization displayed if recorded audio volume below threshold
+      'RENDER_WORKERS': 1,                         # Boards rendered and sent in parallel when sync is off (1 renders them one after another).
+                                                   # Check it pays off for your strips with: python main.py --benchmark-render
+      'AUDIO_QUEUE_SIZE': 4,                       # Audio blocks buffered between capture and rendering before the oldest is dropped
+      'GRADIENT_CACHE_DIR': None,                  # Folder to keep generated gradients in between runs, None only caches them in memory
+      'SYNC_LATENCY': 0.05,                        # Seconds after rendering that boards with timed frames show them, has to cover network delay
+      'OUTPUT': "batch",                           # "batch" sends every board's packets together once a frame is rendered (sendmmsg on Linux),
+                                                   # "async" hands them to an asyncio loop so a slow board never holds up rendering,
+                                                   # "staggered" is async but spreads the boards' sends evenly over the frame interval,
+                                                   # "direct" sends each board's packets as soon as it is rendered
+      'MULTICAST_INTERFACE': None,                 # Address of the interface frames for multicast groups go out of, None for the default route
     },
 
     "devices":devices,
@@ -221,7 +249,39 @@ device_req_config = {"Stripless"   : None, # duh
                      "Fadecandy"   : {"SERVER"     : ["Server Address",
                                                       "Address of Fadecandy server",
                                                       "textbox",
-                                                      "localhost:7890"]}
+                                                      "localhost:7890"]},
+                     "E131"        : {"UDP_IP"     : ["IP Address",
+                                                      "IP address of the controller, leave empty to multicast each universe",
+                                                      "textbox",
+                                                      ""],
+                                      "UNIVERSE"   : ["Universe",
+                                                      "First DMX universe of the strip, each takes 170 LEDs",
+                                                      "textbox",
+                                                      "1"],
+                                      "UDP_PORT"   : ["Port",
+                                                      "Port the controller listens for E1.31 on",
+                                                      "textbox",
+                                                      "5568"]},
+                     "ArtNet"      : {"UDP_IP"     : ["IP Address",
+                                                      "IP address of the controller",
+                                                      "textbox",
+                                                      "xxx.xxx.xxx.xxx"],
+                                      "UNIVERSE"   : ["Universe",
+                                                      "First DMX universe of the strip, each takes 170 LEDs",
+                                                      "textbox",
+                                                      "1"],
+                                      "UDP_PORT"   : ["Port",
+                                                      "Port the controller listens for Art-Net on",
+                                                      "textbox",
+                                                      "6454"]},
+                     "DDP"         : {"UDP_IP"     : ["IP Address",
+                                                      "IP address of the controller",
+                                                      "textbox",
+                                                      "xxx.xxx.xxx.xxx"],
+                                      "UDP_PORT"   : ["Port",
+                                                      "Port the controller listens for DDP on",
+                                                      "textbox",
+                                                      "4048"]}
                      }
 
 
@@ -238,6 +298,8 @@ for board in settings["devices"]:
         settings["devices"][board]["configuration"]["SOFTWARE_GAMMA_CORRECTION"] = False
     elif settings["devices"][board]["configuration"]["TYPE"] == 'Fadecandy':
         settings["devices"][board]["configuration"]["SOFTWARE_GAMMA_CORRECTION"] = False
+    elif settings["devices"][board]["configuration"]["TYPE"] in ('E131', 'ArtNet', 'DDP'):
+        settings["devices"][board]["configuration"]["SOFTWARE_GAMMA_CORRECTION"] = False
     elif settings["devices"][board]["configuration"]["TYPE"] == 'Stripless':
         settings["devices"][board]["configuration"]["SOFTWARE_GAMMA_CORRECTION"] = False
     else:
@@ -21,11 +21,12 @@ class Bars(Effect):
         # Split y into [resulution] chunks and calculate the average of each
         max_values = np.array([max(i) for i in np.array_split(r, board.effectConfig["Bars"]["resolution"])])
         max_values = np.clip(max_values, 0, 1)
+        gradient = board.visualizer.gradients[board.effectConfig["Bars"]["color_mode"]]
+        colors = gradient.view("Bars", board.config["N_PIXELS"])
         color_sets = []
         for i in range(board.effectConfig["Bars"]["resolution"]):
             # [r,g,b] values from a multicolour gradient array at [resulution] equally spaced intervals
-            color_sets.append([board.visualizer.multicolor_modes[board.effectConfig["Bars"]["color_mode"]]\
-                              [j][i*(board.config["N_PIXELS"]//board.effectConfig["Bars"]["resolution"])] for j in range(3)])
+            color_sets.append([colors[j][i*(board.config["N_PIXELS"]//board.effectConfig["Bars"]["resolution"])] for j in range(3)])
         output = np.zeros((3,board.config["N_PIXELS"]))
         chunks = np.array_split(output[0], board.effectConfig["Bars"]["resolution"])
         n = 0
@@ -35,10 +36,7 @@ class Bars(Effect):
             for j in range(3):
                 output[j][n:n+m] = color_sets[i][j]*max_values[i]
             n += m
-        board.visualizer.multicolor_modes[board.effectConfig["Bars"]["color_mode"]] = np.roll(
-                    board.visualizer.multicolor_modes[board.effectConfig["Bars"]["color_mode"]],
-                    board.effectConfig["Bars"]["roll_speed"]*(-1 if board.effectConfig["Bars"]["reverse_roll"] else 1),
-                    axis=1)
+        gradient.roll("Bars", board.effectConfig["Bars"]["roll_speed"]*(-1 if board.effectConfig["Bars"]["reverse_roll"] else 1))
         if board.effectConfig["Bars"]["flip_lr"]:
             output = np.fliplr(output)
         if board.effectConfig["Bars"]["mirror"]:
@@ -7,15 +7,12 @@ import util
 from effects.effect import Effect
 
 class Calibration(Effect):
-	nonReactive = True
-	def __init__(self, visualizer):
-	    self.effectName = "Calibration"
+    nonReactive = True
+    def __init__(self, visualizer):
+        self.effectName = "Calibration"
+        self.output = np.zeros((3, visualizer.board.config["N_PIXELS"]))
 
-	def visualize(self, board, y):
-	    output = np.array([
-	  		[board.effectConfig["Calibration"]["r"] for i in range(board.config["N_PIXELS"])],
-      		[board.effectConfig["Calibration"]["g"] for i in range(board.config["N_PIXELS"])],
-       		[board.effectConfig["Calibration"]["b"] for i in range(board.config["N_PIXELS"])]
-        ])
-
-	    return output
+    def visualize(self, board, y):
+        return self.fill((board.effectConfig["Calibration"]["r"],
+                          board.effectConfig["Calibration"]["g"],
+                          board.effectConfig["Calibration"]["b"]))
@@ -6,9 +6,20 @@ import util
 class Effect():
     nonReactive = False
     effectName = "Effect"
+    # Minimum seconds between frames, 0 renders a new frame for every audio frame.
+    # A "delay" entry in the effect's options overrides this
+    delay = 0
     def __init__(self, visualizer):
         pass
         
     def visualize(self, board, y):
     	pass
 
+    def fill(self, color):
+        """Fill self.output with a single (r, g, b) colour and return it
+
+        Frames that repeat the last one are skipped by the devices, see LEDController.skip
+        """
+        self.output[:] = np.reshape(color, (3, 1))
+        return self.output
+
@@ -7,32 +7,15 @@ from effects.effect import Effect
 
 
 class Fade(Effect):
-	nonReactive = True
-	def __init__(self, visualizer):
-	    self.effectName = "Fade"
+    nonReactive = True
+    def __init__(self, visualizer):
+        self.effectName = "Fade"
+        self.output = np.zeros((3, visualizer.board.config["N_PIXELS"]))
 
-	def visualize(self, board, y):
-		output = np.array([
-        	[
-        		board.visualizer.multicolor_modes[board.effectConfig["Fade"]["color_mode"]][0][0] 
-        		for i in range(board.config["N_PIXELS"])
-        	],
-        	[
-        		board.visualizer.multicolor_modes[board.effectConfig["Fade"]["color_mode"]][1][0]
-        		for i in range(board.config["N_PIXELS"])
-        	],
-            
-            [
-            	board.visualizer.multicolor_modes[board.effectConfig["Fade"]["color_mode"]][2][0] 
-            	for i in range(board.config["N_PIXELS"])
-            ]
-        ])
+    def visualize(self, board, y):
+        gradient = board.visualizer.gradients[board.effectConfig["Fade"]["color_mode"]]
+        output = self.fill(gradient.view("Fade", 1)[:, 0])
 
-		board.visualizer.multicolor_modes[board.effectConfig["Fade"]["color_mode"]] = np.roll(
-			board.visualizer.multicolor_modes[board.effectConfig["Fade"]["color_mode"]],
-			board.effectConfig["Fade"]["roll_speed"]*(-1 if board.effectConfig["Fade"]["reverse"] else 1),
-			axis=1
-        )
-	    
-		return output
+        gradient.roll("Fade", board.effectConfig["Fade"]["roll_speed"]*(-1 if board.effectConfig["Fade"]["reverse"] else 1))
 
+        return output
@@ -12,17 +12,10 @@ class Gradient(Effect):
         self.effectName = "Gradient"
 
     def visualize(self, board, y):
-        output = np.array([
-            board.visualizer.multicolor_modes[board.effectConfig["Gradient"]["color_mode"]][0][:board.config["N_PIXELS"]],
-            board.visualizer.multicolor_modes[board.effectConfig["Gradient"]["color_mode"]][1][:board.config["N_PIXELS"]],
-            board.visualizer.multicolor_modes[board.effectConfig["Gradient"]["color_mode"]][2][:board.config["N_PIXELS"]]
-        ])
-
-        board.visualizer.multicolor_modes[board.effectConfig["Gradient"]["color_mode"]] = np.roll(
-            board.visualizer.multicolor_modes[board.effectConfig["Gradient"]["color_mode"]],
-            board.effectConfig["Gradient"]["roll_speed"]*(-1 if board.effectConfig["Gradient"]["reverse"] else 1),
-            axis=1
-        )
+        gradient = board.visualizer.gradients[board.effectConfig["Gradient"]["color_mode"]]
+        output = gradient.view("Gradient", board.config["N_PIXELS"])
+
+        gradient.roll("Gradient", board.effectConfig["Gradient"]["roll_speed"]*(-1 if board.effectConfig["Gradient"]["reverse"] else 1))
         
         if board.effectConfig["Gradient"]["mirror"]:
             output = np.concatenate((output[:, ::-2], output[:, ::2]), axis=1)
@@ -4,42 +4,29 @@ import config  as config
 import util
 
 from effects.effect import Effect
-import math
 class Runner(Effect):
     nonReactive = True
     def __init__(self, board):
         self.effectName = "Wave"
         self.position = 0
+        self.pixels = np.arange(board.board.config["N_PIXELS"])
+        self.output = np.zeros((3, board.board.config["N_PIXELS"]))
+        self.blurred = np.zeros((3, board.board.config["N_PIXELS"]))
 
     def visualize(self, board, y):
        # print('Beat vis called')
-        output = np.array([
-            [(((math.sin(i * board.effectConfig["Runner"]["times"] + (self.position/board.effectConfig["Runner"]["divide"]))+board.effectConfig["Runner"]["add"])*255)) for i in range(board.config["N_PIXELS"])],
-            [(((math.sin(i * board.effectConfig["Runner"]["times"] + (self.position/board.effectConfig["Runner"]["divide"]))+board.effectConfig["Runner"]["add"])*255)) for i in range(board.config["N_PIXELS"])],
-            [(((math.sin(i * board.effectConfig["Runner"]["times"] + (self.position/board.effectConfig["Runner"]["divide"]))+board.effectConfig["Runner"]["add"])*255)) for i in range(board.config["N_PIXELS"])]
-        ])
+        # Sine wave moving along the strip, the same for every colour channel
+        wave = (np.sin(self.pixels * board.effectConfig["Runner"]["times"] + (self.position/board.effectConfig["Runner"]["divide"]))+board.effectConfig["Runner"]["add"])*255
 
+        outputGradient = board.visualizer.multicolor_modes[board.effectConfig["Runner"]["color_mode"]][:, :board.config["N_PIXELS"]]
 
-        outputGradient = np.array(
-            [
-                board.visualizer.multicolor_modes[board.effectConfig["Runner"]["color_mode"]][0][:board.config["N_PIXELS"]],
-                board.visualizer.multicolor_modes[board.effectConfig["Runner"]["color_mode"]][1][:board.config["N_PIXELS"]],
-                board.visualizer.multicolor_modes[board.effectConfig["Runner"]["color_mode"]][2][:board.config["N_PIXELS"]],
-            ]
-        )
+        np.multiply(outputGradient, wave, out=self.output)
+        self.output /= 255
+        output = self.output
 
-        output[0] = np.multiply(output[0], outputGradient[0]/255)
-        output[1] = np.multiply(output[1], outputGradient[1]/255)
-        output[2] = np.multiply(output[2], outputGradient[2]/255)
-          
         if(board.effectConfig["Runner"]["blur"] > 0):
-            output[0] = gaussian_filter1d(output[0], sigma=board.effectConfig["Runner"]["blur"])
-            output[1] = gaussian_filter1d(output[1], sigma=board.effectConfig["Runner"]["blur"])
-            output[2] = gaussian_filter1d(output[2], sigma=board.effectConfig["Runner"]["blur"])
+            output = gaussian_filter1d(self.output, sigma=board.effectConfig["Runner"]["blur"], axis=1, output=self.blurred)
 
         self.position+=1
 
         return output
-
-
-
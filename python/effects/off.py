@@ -9,8 +9,7 @@ class Off(Effect):
     nonReactive = True
     def __init__(self, visualizer):
         self.effectName = "Off"
+        self.output = np.zeros((3, visualizer.board.config["N_PIXELS"]))
 
     def visualize(self, board, y):
-        output = np.zeros((3, board.config["N_PIXELS"]))
-
-        return output
\ No newline at end of file
+        return self.fill((0, 0, 0))
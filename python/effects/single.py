@@ -9,12 +9,7 @@ class Single(Effect):
     nonReactive = True
     def __init__(self, visualizer):
         self.effectName = "Single"
+        self.output = np.zeros((3, visualizer.board.config["N_PIXELS"]))
 
     def visualize(self, board, y):
-        output = np.array([
-            [config.settings["colors"][board.effectConfig["Single"]["color"]][0] for i in range(board.config["N_PIXELS"])],
-            [config.settings["colors"][board.effectConfig["Single"]["color"]][1] for i in range(board.config["N_PIXELS"])],
-            [config.settings["colors"][board.effectConfig["Single"]["color"]][2] for i in range(board.config["N_PIXELS"])]
-        ])
-
-        return output
\ No newline at end of file
+        return self.fill(config.settings["colors"][board.effectConfig["Single"]["color"]])
@@ -10,6 +10,7 @@ class Sleep(Effect):
     nonReactive = True
     def __init__(self, visualizer):
         self.effectName = "Sleep"
+        self.output = np.zeros((3, visualizer.board.config["N_PIXELS"]))
 
     def visualize(self, board, y):
         brightness = 0
@@ -22,10 +23,4 @@ class Sleep(Effect):
         if secondsAfter > 0 and secondsAfter <= secondsActive:
             brightness = 150 * (secondsAfter / secondsActive)
 
-        output = np.array([
-            [brightness for i in range(board.config["N_PIXELS"])],
-            [brightness for i in range(board.config["N_PIXELS"])],
-            [brightness for i in range(board.config["N_PIXELS"])],
-        ])
-
-        return output
\ No newline at end of file
+        return self.fill((brightness, brightness, brightness))
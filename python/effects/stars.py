@@ -12,10 +12,11 @@ class Stars(Effect):
     nonReactive = True
 
     star_brightness = 0
-    stars = {}
-    dead_stars = []
     def __init__(self, visualizer):
         self.effectName = "Stars"
+        # Kept per instance, a class level dict would be shared (and mutated) by every board's renderer
+        self.stars = {}
+        self.dead_stars = []
         
     def visualize(self, board, y):
         output = np.zeros((3,board.config["N_PIXELS"]))
@@ -20,20 +20,11 @@ class Wavelength(Effect):
         g = np.abs(diff)
         b = board.signalProcessor.b_filt.update(np.copy(y))
         r = np.array([j for i in zip(r,r) for j in i])
-        output = np.array([board.visualizer.multicolor_modes[board.effectConfig["Wavelength"]["color_mode"]][0][
-                                    (board.config["N_PIXELS"] if board.effectConfig["Wavelength"]["reverse_grad"] else 0):
-                                    (None if board.effectConfig["Wavelength"]["reverse_grad"] else board.config["N_PIXELS"]):]*r,
-                           board.visualizer.multicolor_modes[board.effectConfig["Wavelength"]["color_mode"]][1][
-                                    (board.config["N_PIXELS"] if board.effectConfig["Wavelength"]["reverse_grad"] else 0):
-                                    (None if board.effectConfig["Wavelength"]["reverse_grad"] else board.config["N_PIXELS"]):]*r,
-                           board.visualizer.multicolor_modes[board.effectConfig["Wavelength"]["color_mode"]][2][
-                                    (board.config["N_PIXELS"] if board.effectConfig["Wavelength"]["reverse_grad"] else 0):
-                                    (None if board.effectConfig["Wavelength"]["reverse_grad"] else board.config["N_PIXELS"]):]*r])
+        gradient = board.visualizer.gradients[board.effectConfig["Wavelength"]["color_mode"]]
+        output = gradient.view("Wavelength", board.config["N_PIXELS"],
+                               start=board.config["N_PIXELS"] if board.effectConfig["Wavelength"]["reverse_grad"] else 0)*r
         #board.visualizer.prev_spectrum = y
-        board.visualizer.multicolor_modes[board.effectConfig["Wavelength"]["color_mode"]] = np.roll(
-                    board.visualizer.multicolor_modes[board.effectConfig["Wavelength"]["color_mode"]],
-                    board.effectConfig["Wavelength"]["roll_speed"]*(-1 if board.effectConfig["Wavelength"]["reverse_roll"] else 1),
-                    axis=1)
+        gradient.roll("Wavelength", board.effectConfig["Wavelength"]["roll_speed"]*(-1 if board.effectConfig["Wavelength"]["reverse_roll"] else 1))
         output[0] = gaussian_filter1d(output[0], sigma=board.effectConfig["Wavelength"]["blur"])
         output[1] = gaussian_filter1d(output[1], sigma=board.effectConfig["Wavelength"]["blur"])
         output[2] = gaussian_filter1d(output[2], sigma=board.effectConfig["Wavelength"]["blur"])
@@ -0,0 +1,51 @@
+"""Clocks for timed frames (see FLAG_TIMED in lib/packets.py)
+
+Timestamps are microseconds in 32 bits, like micros() on the ESP8266, so they
+wrap about every 71 minutes and are only ever compared through wrapped().
+"""
+import time
+from collections import deque
+import lib.packets as packets
+
+
+def now_us():
+    """This host's clock in microseconds, wrapping at 32 bits"""
+    return int(time.monotonic() * 1e6) & 0xFFFFFFFF
+
+
+def wrapped(difference):
+    """Interpret the difference of two 32 bit microsecond times as signed"""
+    return (difference + 0x80000000) % 0x100000000 - 0x80000000
+
+
+class ClockOffset():
+    """Estimate of how far a receiver's clock is ahead of this host's
+
+    Each TYPE_PING round trip gives a guess that is out by at most half the
+    round trip time, so the guess from the quickest of the last few round
+    trips is used.
+    """
+    def __init__(self, samples=8):
+        self.samples = deque(maxlen=samples)    # (round trip, offset) in microseconds
+        self.offset = None                      # None until a TYPE_PONG has come back
+        self.rtt = None
+
+    def ping(self):
+        return packets.clock_packet(packets.TYPE_PING, now_us())
+
+    def pong(self, packet, now=None):
+        """Update the estimate from a TYPE_PONG, returns False if the packet isn't one"""
+        if len(packet) < packets.HEADER.size + packets.CLOCK.size or packet[0] != packets.MAGIC \
+                or packet[1] & packets.TYPE_MASK != packets.TYPE_PONG:
+            return False
+        t0, t1 = packets.CLOCK.unpack_from(packet, packets.HEADER.size)
+        rtt = wrapped((now_us() if now is None else now) - t0)
+        if rtt < 0:
+            return False
+        self.samples.append((rtt, wrapped(t1 - (t0 + rtt // 2))))
+        self.rtt, self.offset = min(self.samples)
+        return True
+
+    def to_receiver(self, host_us):
+        """Convert a time on this host's clock to the receiver's"""
+        return (host_us + self.offset) & 0xFFFFFFFF
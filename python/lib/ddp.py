@@ -0,0 +1,98 @@
+"""DDP (Distributed Display Protocol) packets, as taken by WLED, xLights and most pixel controllers
+
+Every packet is a 10 byte header and up to 1440 bytes of r, g, b data:
+    |flags|sequence|data type|destination|offset (4 bytes)|length (2 bytes)|data|
+with offset and length in bytes, big endian. The controller writes the data at
+the offset and only shows the frame once a packet with the push flag arrives,
+so a frame is any number of packets and only the last one has push set. A
+device keeps one buffer that holds all its packets with their headers filled in
+once, each frame only writes its pixels and the sequence number in.
+
+Sink is a stand-in controller that counts what arrives, run one with
+    python -m lib.ddp 4048 300
+with the port and the number of LEDs.
+"""
+import struct
+import sys
+import time
+import lib.sink as sink
+
+PORT = 4048
+HEADER = struct.Struct(">BBBBIH")
+MAX_DATA = 1440
+"""Most data bytes in one packet, 480 pixels, so a packet fits an Ethernet frame"""
+
+FLAG_VERSION = 0x40
+FLAG_PUSH = 0x01
+TYPE_RGB8 = 0x0B
+DESTINATION_DISPLAY = 1
+
+
+class Frame():
+    """Preallocated packets for every chunk of a board's pixels"""
+    def __init__(self, n_pixels):
+        size = 3 * n_pixels
+        self.lengths = [min(MAX_DATA, size - offset) for offset in range(0, size, MAX_DATA)]
+        # Packets back to back in one buffer, the data of each right after its header
+        self.buffer = bytearray(HEADER.size * len(self.lengths) + size)
+        self._view = memoryview(self.buffer)
+        self._packets = []      # (start, end) of every packet in the buffer
+        self._data = []         # (start in the buffer, offset in the frame, length) of every packet's data
+        start = 0
+        for i, length in enumerate(self.lengths):
+            offset = i * MAX_DATA
+            flags = FLAG_VERSION | (FLAG_PUSH if i == len(self.lengths) - 1 else 0)
+            HEADER.pack_into(self.buffer, start, flags, 0, TYPE_RGB8, DESTINATION_DISPLAY, offset, length)
+            self._packets.append((start, start + HEADER.size + length))
+            self._data.append((start + HEADER.size, offset, length))
+            start += HEADER.size + length
+        self.sequence = 0
+
+    def encode(self, rgb):
+        """Return the packets of a frame from its r, g, b bytes
+
+        The packets are views of the buffer, so they are only valid until the
+        next call. Copy them with bytes() to keep them longer.
+        """
+        # 1 to 15, 0 means the sender doesn't number its packets
+        self.sequence = self.sequence % 15 + 1
+        for (start, offset, length), (packet, _) in zip(self._data, self._packets):
+            self.buffer[start:start + length] = rgb[offset:offset + length]
+            self.buffer[packet + 1] = self.sequence
+        return [self._view[start:end] for start, end in self._packets]
+
+
+class Sink(sink.Sink):
+    """Stand-in DDP controller that keeps the last frame pushed and times frames"""
+    def __init__(self, n_pixels, port=0, host="127.0.0.1"):
+        super().__init__(port, host)
+        self.leds = bytearray(3 * n_pixels)
+        self.shown = bytes(self.leds)   # r, g, b bytes of the last frame pushed
+        self.packets = 0
+        self.frames = 0         # Packets with the push flag
+        self.bad = 0            # Packets with a bad header or that don't fit the strip
+
+    def serve(self):
+        while True:
+            packet = self.sock.recv(2048)
+            now = time.monotonic()
+            self.packets += 1
+            if len(packet) < HEADER.size:
+                self.bad += 1
+                continue
+            flags, sequence, kind, destination, offset, length = HEADER.unpack_from(packet)
+            if flags & 0xC0 != FLAG_VERSION or len(packet) != HEADER.size + length or offset + length > len(self.leds):
+                self.bad += 1
+                continue
+            self.leds[offset:offset + length] = packet[HEADER.size:]
+            if flags & FLAG_PUSH:
+                self.shown = bytes(self.leds)
+                self.frames += 1
+                self.frame_times.append(now)
+
+    def report(self):
+        return "{} packets, {} frames, {} bad, {}".format(self.packets, self.frames, self.bad, self.intervals())
+
+
+if __name__ == "__main__":
+    sink.run(Sink(int(sys.argv[2]) if len(sys.argv) > 2 else 5000, int(sys.argv[1]), "0.0.0.0"))
@@ -1,12 +1,70 @@
 import time
+import threading
 import numpy as np
 import config as config
+import lib.packets as packets
+from lib.clock import ClockOffset
+from lib.lut import LUT
 
 class LEDController:
-    def __init__(self):
-        pass
+    def __init__(self, skip_threshold=0, refresh_interval=1.0):
+        """
+        skip_threshold: int, optional
+            Frames where no channel of any LED differs from the last frame sent
+            by more than this are skipped. 0 only skips identical frames.
+        refresh_interval: float, optional
+            Seconds after which a frame is sent even if it would be skipped,
+            so a controller that rebooted gets the picture back.
+        """
+        self.skip_threshold = skip_threshold
+        self.refresh_interval = refresh_interval
+        self.sent = 0               # Frames sent
+        self.skipped = 0            # Frames skipped for matching the last one sent
+        self.bytes_skipped = 0      # r, g, b bytes those frames would have been
+        self.refreshed = False      # True when the last frame sent was only sent because refresh_interval ran out
+        self._last = None           # r, g, b bytes of the last frame sent
+        self._last_time = 0.0
+        # Brightness, white balance and gamma, brought up to date by whoever owns the board
+        self.lut = LUT()
+
+    def skip(self, rgb):
+        """Compare the r, g, b bytes of a frame with the last frame sent
+
+        Returns True, and counts it, if the frame should be skipped.
+        Otherwise the frame becomes the last one sent.
+        """
+        now = time.time()
+        similar = self._last is not None and (rgb == self._last or (
+            self.skip_threshold > 0 and len(rgb) == len(self._last) and self._difference(rgb) <= self.skip_threshold))
+        if similar and now - self._last_time < self.refresh_interval:
+            self.skipped += 1
+            self.bytes_skipped += len(rgb)
+            return True
+        self.refreshed = similar or self._last is None
+        self._last = rgb
+        self._last_time = now
+        self.sent += 1
+        return False
+
+    def forget(self):
+        """Forget the last frame sent, for when the strip was sent frames some other way
 
-    def show(self, pixels):
+        The next frame is then sent even if it matches, and in full with the delta protocol.
+        """
+        self._last = None
+
+    def _difference(self, rgb):
+        # Largest change of any channel, uint8 max - min can't wrap around
+        current = np.frombuffer(rgb, dtype=np.uint8)
+        last = np.frombuffer(self._last, dtype=np.uint8)
+        return int((np.maximum(current, last) - np.minimum(current, last)).max())
+
+    def stats(self):
+        return {"sent": self.sent,
+                "skipped": self.skipped,
+                "bytes_skipped": self.bytes_skipped}
+
+    def show(self, pixels, present=None):
         """
         pixels: numpy.ndarray
             2D array containing RGB pixel values for each of the LEDs.
@@ -17,7 +75,10 @@ class LEDController:
             Each column (axis 1) contains the red, green, and blue color values
             for a single pixel:
                 np.array([ [r0, ..., rN], [g0, ..., gN], [b0, ..., bN]])
-            Each value brightness value is an integer between 0 and 255.
+            Each value is between 0 and 255, before lut is applied.
+        present: float, optional
+            time.monotonic() time to show the frame at, for controllers that
+            support timed frames. Others show it straight away.
         """
         
         raise NotImplementedError('Show() was not implemented')
@@ -40,7 +101,16 @@ class ESP8266(LEDController):
     def __init__(self,
                  ip='192.168.0.150',
                  leds=100,
-                 port=7778):
+                 port=7778,
+                 protocol="raw",
+                 keyframe_interval=60,
+                 skip_threshold=0,
+                 refresh_interval=1.0,
+                 output=None,
+                 timed=False,
+                 latency=0.05,
+                 ping_interval=1.0,
+                 multicast_interface=None):
         """Initialize object for communicating with as ESP8266
         Parameters
         ----------
@@ -51,12 +121,68 @@ class ESP8266(LEDController):
         port: int, optional
             The port number to use when sending data to the ESP8266. This
             must exactly match the port number in the ESP8266's firmware.
+        protocol: str, optional
+            "raw" sends the whole strip as one datagram, which stops fitting
+            in a single unfragmented packet at about 490 LEDs. "chunked"
+            splits every frame into headed packets that each fit in one
+            (see lib/packets.py). "compressed" is chunked but sends each frame
+            as runs of identical LEDs or indices into a palette when that is
+            smaller. "delta" is compressed but only sends the runs of LEDs
+            that changed, whenever that is smaller than the whole frame.
+        keyframe_interval: int, optional
+            With the delta protocol, the whole frame is sent at least once
+            every this many frames so the strip recovers from lost packets.
+        skip_threshold, refresh_interval: optional
+            When to skip frames that barely changed, see LEDController.
+        output: lib.output.OutputBatch or lib.output.OutputEngine, optional
+            Output stage to queue packets in instead of sending them straight
+            away, whoever owns it flushes it.
+        timed: bool, optional
+            Stamp frames with a sequence number and the time to show them at,
+            so the ESP8266 drops reordered frames and shows the rest on time.
+            Needs a headed protocol. Frames are sent untimed until the first
+            clock reading comes back from the ESP8266.
+        latency: float, optional
+            Seconds after sending that a timed frame is shown at, unless
+            show is given a time. Has to cover the network delay.
+        ping_interval: float, optional
+            Seconds between clock readings requested from the ESP8266.
+        multicast_interface: str, optional
+            Address of the interface to send from when ip is a multicast
+            group and there is no output stage, None for the default route.
         """
         import socket
+        super().__init__(skip_threshold, refresh_interval)
+        if protocol not in ("raw", "chunked", "compressed", "delta"):
+            raise ValueError("Invalid protocol {} for ESP8266".format(protocol))
+        if timed and protocol == "raw":
+            raise ValueError("Timed frames need a headed protocol, not raw")
         self._ip = ip
         self._port = port
         self._leds = leds
-        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._protocol = protocol
+        self._frame = 0
+        self._keyframe_interval = keyframe_interval
+        # LEDs the strip should be showing after the last frame, and frames sent since the last full one
+        self._sent = None
+        self._since_keyframe = 0
+        self._output = output
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM) if output is None else None
+        if self._sock is not None and multicast_interface is not None:
+            self._sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(multicast_interface))
+        self._clock = None
+        # Timed frames get the |seq|pts| extension inserted into every packet, which still has to fit
+        self._max_payload = packets.MAX_PAYLOAD - packets.TIMED.size if timed else packets.MAX_PAYLOAD
+        if timed:
+            # Clock readings come back to the socket the ping went out of, so this needs its own
+            self._clock = ClockOffset()
+            self._latency = latency
+            self._ping_interval = ping_interval
+            self._next_ping = 0.0
+            self._seq = 0
+            self._clock_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            # Replies are read as they arrive, one left waiting for the next frame would look like a slow round trip
+            threading.Thread(target=self._read_clock, daemon=True).start()
 
     def detect(self):
         from subprocess import check_output
@@ -76,24 +202,479 @@ class ESP8266(LEDController):
         print("Found device {}, with IP address {}".format(self._mac_addr, ip_addr))
         self._ip = ip_addr
 
-    def show(self, pixels):
+    def packets(self, pixels, present=None):
+        """Encode pixels into the datagrams for one frame, none if the frame is skipped
+        With the raw protocol this is a single datagram of
+            |r|g|b|r|g|b|...
+        for every LED on the strip. The chunked protocol sends the same bytes
+        split into packets with a |magic|type|frame|offset|count| header, the
+        compressed protocol picks the smallest of several encodings of them,
+        and the delta protocol only sends the LEDs that changed since the
+        previous frame.
+        Timed frames are shown at present, a time.monotonic() time.
+        """
+        rgb = self.lut.apply(pixels[:, :self._leds]).tobytes()
+        if self.skip(rgb):
+            return []
+        frame_packets = self._encode(rgb)
+        if self._clock is None:
+            return frame_packets
+        self._ping()
+        if self._clock.offset is None:
+            return frame_packets
+        self._seq = (self._seq + 1) & 0xFFFF
+        if present is None:
+            present = time.monotonic() + self._latency
+        return packets.stamp(frame_packets, self._seq, self._clock.to_receiver(int(present * 1e6)))
+
+    def _read_clock(self):
+        while True:
+            try:
+                self._clock.pong(self._clock_sock.recv(64))
+            except OSError:
+                # ICMP unreachable from an earlier ping, or the ping hasn't gone out yet
+                time.sleep(self._ping_interval)
+
+    def _ping(self):
+        now = time.monotonic()
+        if now >= self._next_ping:
+            self._next_ping = now + self._ping_interval
+            try:
+                self._clock_sock.sendto(self._clock.ping(), (self._ip, self._port))
+            except OSError:
+                pass
+
+    def _encode(self, rgb):
+        if self._protocol == "raw":
+            return [rgb]
+        self._frame = (self._frame + 1) & 0xFF
+        if self._protocol == "chunked":
+            return packets.chunk_frame(rgb, self._frame, self._max_payload)
+        leds = np.frombuffer(rgb, dtype=np.uint8).reshape(-1, 3)
+        size, encode = packets.compression(leds, self._max_payload)
+        if self._protocol == "delta":
+            keyframe = self.refreshed or self._sent is None or self._since_keyframe >= self._keyframe_interval
+            self._sent, previous = leds, self._sent
+            if not keyframe:
+                starts, stops = packets.changed_runs(leds, previous)
+                if packets.delta_size(starts, stops) < size:
+                    self._since_keyframe += 1
+                    return packets.delta_frame(leds, starts, stops, self._frame, self._max_payload)
+            self._since_keyframe = 0
+        return encode(self._frame)
+
+    def show(self, pixels, present=None):
         """Sends UDP packets to ESP8266 to update LED strip values
         The ESP8266 will receive and decode the packets to determine what values
-        to display on the LED strip. The communication protocol supports LED strips
-        with a maximum of 256 LEDs.
-        The packet encoding scheme is:
-            |i|r|g|b|
-        where
-            i (0 to 255): Index of LED to change (zero-based)
-            r (0 to 255): Red value of LED
-            g (0 to 255): Green value of LED
-            b (0 to 255): Blue value of LED
+        to display on the LED strip. With timed frames they are shown at
+        present, a time.monotonic() time, or after the device's latency.
+        """
+        if self._output is not None:
+            self._output.add(self.packets(pixels, present), (self._ip, self._port))
+            return
+        for packet in self.packets(pixels, present):
+            self._sock.sendto(packet, (self._ip, self._port))
+
+
+
+
+
+
+def grb_words(rgb):
+    """Pack (n, 3) r, g, b rows into the 0x00GGRRBB words rpi_ws281x takes"""
+    p = rgb.astype(np.uint32)
+    return (p[:, 1] << 16) | (p[:, 0] << 8) | p[:, 2]
+
+
+def grb_bytes(rgb):
+    """Return (n, 3) r, g, b rows as n * 3 bytes of g, r, b as a BlinkStick takes them"""
+    return rgb[:, [1, 0, 2]].ravel()
+
+
+def write_changed(data, words, previous):
+    """Write the words that differ from previous into data, the strip's buffer, one by one"""
+    changed = words != previous
+    for i, word in zip(np.flatnonzero(changed).tolist(), words[changed].tolist()):
+        data[i] = word
+
+
+class RaspberryPi(LEDController):
+    def __init__(self,
+                 leds=100,
+                 pin=10,
+                 freq_hz=800000,
+                 dma=5,
+                 invert=True,
+                 skip_threshold=0,
+                 refresh_interval=1.0):
+        """Initialize object for driving an LED strip from the Raspberry Pi's GPIO
+        Parameters
+        ----------
+        pin: int, optional
+            GPIO pin connected to the LED strip, it must support PWM.
+        freq_hz: int, optional
+            LED signal frequency in Hz.
+        dma: int, optional
+            DMA channel used for generating the PWM signal.
+        invert: bool, optional
+            True if using an inverting logic level converter.
+        """
+        import neopixel
+        super().__init__(skip_threshold, refresh_interval)
+        self._leds = leds
+        self._strip = neopixel.Adafruit_NeoPixel(leds, pin, freq_hz, dma, invert, 255)
+        self._strip.begin()
+        self._words = np.zeros(leds, dtype=np.uint32)
+
+    def show(self, pixels, present=None):
+        """Writes the LEDs that changed since the last frame into the strip's buffer and shows it"""
+        words = grb_words(self.lut.apply(pixels[:, :self._leds]))
+        if self.skip(words.tobytes()):
+            return
+        write_changed(self._strip._led_data, words, self._words)
+        self._words = words
+        self._strip.show()
+
+
+class BlinkStick(LEDController):
+    def __init__(self, leds=32, skip_threshold=0, refresh_interval=1.0):
+        """Initialize object for driving the first BlinkStick found on USB"""
+        from blinkstick import blinkstick
+        super().__init__(skip_threshold, refresh_interval)
+        # BlinkSticks have always been sent at most 250 before gamma
+        self.lut = LUT(clip=250)
+        self._leds = leds
+        self._stick = blinkstick.find_first()
+
+    def show(self, pixels, present=None):
+        data = grb_bytes(self.lut.apply(pixels[:, :self._leds]))
+        if self.skip(data.tobytes()):
+            return
+        self._stick.set_led_data(0, data.tolist())
+
+
+class Fadecandy(LEDController):
+    def __init__(self,
+                 server="localhost:7890",
+                 channel=0,
+                 leds=64,
+                 skip_threshold=0,
+                 refresh_interval=1.0):
+        """Initialize object for sending to a Fadecandy, or any Open Pixel Control server
+        Parameters
+        ----------
+        server: str, optional
+            "host:port" of the server. Boards on the same server share one
+            connection, see lib/opc.py.
+        channel: int, optional
+            OPC channel of the strip, 0 sends to every channel.
+        """
+        import lib.opc as opc
+        super().__init__(skip_threshold, refresh_interval)
+        self._leds = leds
+        self._channel = channel
+        self._connection = opc.connection(server)
+        self._connection.attach(channel)
+
+    def show(self, pixels, present=None):
+        rgb = self.lut.apply(pixels[:, :self._leds]).tobytes()
+        if self.skip(rgb):
+            return
+        self._connection.queue(self._channel, rgb)
+
+
+class DMX(LEDController):
+    def __init__(self,
+                 ip=None,
+                 leds=170,
+                 universe=1,
+                 protocol="e131",
+                 sync_universe=0,
+                 port=None,
+                 skip_threshold=0,
+                 refresh_interval=1.0,
+                 output=None):
+        """Initialize object for sending to an E1.31 (sACN) or Art-Net pixel controller
+        Parameters
+        ----------
+        ip: str, optional
+            Address of the controller. E1.31 sends to each universe's
+            multicast group when this is None.
+        universe: int, optional
+            First universe of the strip, every 170 LEDs take another one.
+        protocol: str, optional
+            "e131" or "artnet".
+        sync_universe: int, optional
+            Send a sync packet after every frame so the controller shows
+            all universes at once. 0 for no sync. Art-Net ignores the number.
+        port: int, optional
+            Defaults to the protocol's standard port.
+        output: lib.output.OutputBatch or lib.output.OutputEngine, optional
+            Output stage to queue packets in, see ESP8266.
         """
+        import socket
+        import lib.dmx as dmx
+        super().__init__(skip_threshold, refresh_interval)
+        if ip is None and protocol != "e131":
+            raise ValueError("Art-Net needs the controller's ip")
+        self._leds = leds
+        self._frame = dmx.Frame(leds, universe, protocol, sync_universe)
+        if port is None:
+            port = dmx.E131_PORT if protocol == "e131" else dmx.ARTNET_PORT
+        if ip is None:
+            self._addresses = [(dmx.multicast_address(u), port) for u in self._frame.universes]
+            sync_address = (dmx.multicast_address(sync_universe), port)
+            # Every universe has a group of its own, the output stage still paces and orders them as one device
+            self.key = "E1.31 universe {}".format(universe)
+        else:
+            self._addresses = [(ip, port)] * len(self._frame.universes)
+            sync_address = (ip, port)
+            self.key = (ip, port)
+        if sync_universe:
+            self._addresses.append(sync_address)
+        self._output = output
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM) if output is None else None
+
+    def show(self, pixels, present=None):
+        rgb = self.lut.apply(pixels[:, :self._leds]).tobytes()
+        if self.skip(rgb):
+            return
+        frame = self._frame.encode(rgb)
+        if self._output is not None:
+            # All under one key, so the universes keep their order and the sync packet goes last
+            for packet, address in zip(frame, self._addresses):
+                self._output.add([packet], address, self.key)
+            return
+        for packet, address in zip(frame, self._addresses):
+            self._sock.sendto(packet, address)
+
+
+class DDP(LEDController):
+    def __init__(self,
+                 ip='192.168.0.150',
+                 leds=300,
+                 port=None,
+                 skip_threshold=0,
+                 refresh_interval=1.0,
+                 output=None):
+        """Initialize object for sending to a DDP pixel controller, such as WLED
+        Parameters
+        ----------
+        ip: str, optional
+            The IP address of the controller.
+        port: int, optional
+            Defaults to the standard DDP port, 4048.
+        output: lib.output.OutputBatch or lib.output.OutputEngine, optional
+            Output stage to queue packets in, see ESP8266.
+        """
+        import socket
+        import lib.ddp as ddp
+        super().__init__(skip_threshold, refresh_interval)
+        self._leds = leds
+        self._address = (ip, ddp.PORT if port is None else port)
+        self._frame = ddp.Frame(leds)
+        self._output = output
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM) if output is None else None
+
+    def show(self, pixels, present=None):
+        rgb = self.lut.apply(pixels[:, :self._leds]).tobytes()
+        if self.skip(rgb):
+            return
+        frame = self._frame.encode(rgb)
+        if self._output is not None:
+            # The packets are reused by the next frame, and the output stage sends them later
+            self._output.add([bytes(packet) for packet in frame], self._address)
+            return
+        for packet in frame:
+            self._sock.sendto(packet, self._address)
+
+
+class Stripless(LEDController):
+    """Controller for boards with no strip attached, frames are counted and dropped"""
+    def show(self, pixels, present=None):
+        self.sent += 1
+
+
+class MulticastGroup():
+    """Synced ESP8266s of the same length that take their frames from one multicast datagram
+
+    Their firmware has to join the group. Frames only go to the group while
+    every member would be sent the same bytes, so with the same brightness,
+    white balance and gamma, otherwise the members are sent theirs one by one.
+    """
+    def __init__(self, group, board_configs, controllers, output=None, interface=None):
+        """
+        group: str
+            "address" or "address:port" of the group, the port defaults to
+            the members' port.
+        board_configs: list
+            Configuration of every member, from config.settings["devices"].
+        controllers: list
+            LEDController of every member, in the same order.
+        interface: str, optional
+            Address of the interface to send to the group from, None for the
+            default route.
+        """
+        first = board_configs[0]
+        address, _, port = group.partition(":")
+        # Without a port of its own the group is sent to the port the members listen on
+        same = ("N_PIXELS", "PROTOCOL") if port else ("N_PIXELS", "PROTOCOL", "UDP_PORT")
+        for board_config in board_configs:
+            if board_config["TYPE"] != "ESP8266":
+                raise ValueError("Only ESP8266 boards can share a multicast group, not {}".format(board_config["TYPE"]))
+            if board_config["TIMED"]:
+                raise ValueError("Timed frames are stamped for each board's clock, so they can't be multicast")
+            for key in same:
+                if board_config[key] != first[key]:
+                    raise ValueError("Boards in multicast group {} need the same {}".format(group, key))
+        self.controllers = controllers
+        self.address = (address, int(port or first["UDP_PORT"]))
+        self.esp = ESP8266(ip=address,
+                           port=self.address[1],
+                           leds=first["N_PIXELS"],
+                           protocol=first["PROTOCOL"],
+                           keyframe_interval=first["KEYFRAME_INTERVAL"],
+                           skip_threshold=first["SKIP_THRESHOLD"],
+                           refresh_interval=first["REFRESH_INTERVAL"],
+                           output=output,
+                           multicast_interface=interface)
+        self.multicast = 0      # Frames that went to the group
+        self.unicast = 0        # Frames the members had to be sent one by one
+
+    def show(self, pixels, present=None):
+        """Send a frame to the group, returns False if the members have to be shown it one by one"""
+        settings = self.controllers[0].lut.settings
+        if any(controller.lut.settings != settings for controller in self.controllers):
+            self.unicast += 1
+            self.forget()
+            return False
+        self.esp.lut.update(*settings)
+        self.esp.show(pixels, present)
+        self.multicast += 1
+        for controller in self.controllers:
+            controller.forget()
+        return True
+
+    def forget(self):
+        """Forget the last frame sent to the group, for when the members were sent theirs one by one
+
+        Each member then holds a frame the group didn't send, so the next
+        frame to the group is sent in full even if it matches the last one.
+        """
+        self.esp.forget()
+
+
+def create(board_config, output=None):
+    """Build the LEDController for a board from its configuration in config.settings["devices"]
+
+    output is passed on to controllers that send over the network.
+    """
+    kind = board_config["TYPE"]
+    common = {"skip_threshold": board_config["SKIP_THRESHOLD"],
+              "refresh_interval": board_config["REFRESH_INTERVAL"]}
+    if kind == "ESP8266":
+        return ESP8266(ip=board_config["UDP_IP"],
+                       port=board_config["UDP_PORT"],
+                       leds=board_config["N_PIXELS"],
+                       protocol=board_config["PROTOCOL"],
+                       keyframe_interval=board_config["KEYFRAME_INTERVAL"],
+                       output=output,
+                       timed=board_config["TIMED"],
+                       latency=config.settings["configuration"]["SYNC_LATENCY"],
+                       **common)
+    if kind == "RaspberryPi":
+        return RaspberryPi(leds=board_config["N_PIXELS"],
+                           pin=board_config["LED_PIN"],
+                           freq_hz=board_config["LED_FREQ_HZ"],
+                           dma=board_config["LED_DMA"],
+                           invert=board_config["LED_INVERT"],
+                           **common)
+    if kind == "BlinkStick":
+        return BlinkStick(leds=board_config["N_PIXELS"], **common)
+    if kind == "Fadecandy":
+        return Fadecandy(server=board_config["SERVER"],
+                         channel=board_config["CHANNEL"],
+                         leds=board_config["N_PIXELS"],
+                         **common)
+    if kind in ("E131", "ArtNet"):
+        return DMX(ip=board_config["UDP_IP"] or None,
+                   leds=board_config["N_PIXELS"],
+                   universe=board_config["UNIVERSE"],
+                   protocol=kind.lower(),
+                   sync_universe=board_config["SYNC_UNIVERSE"],
+                   port=board_config["UDP_PORT"],
+                   output=output,
+                   **common)
+    if kind == "DDP":
+        return DDP(ip=board_config["UDP_IP"],
+                   port=board_config["UDP_PORT"],
+                   leds=board_config["N_PIXELS"],
+                   output=output,
+                   **common)
+    if kind == "Stripless":
+        return Stripless(**common)
+    raise ValueError("Unsupported device type {}".format(kind))
+
+
+def benchmark_encode(n_pixels=1000, frames=1000):
+    """Print how long each controller takes to encode a frame, per 1000 LEDs
 
-        message = pixels.T.clip(0, config.settings["configuration"]["maxBrightness"])[0:self._leds].astype(np.uint8).ravel().tostring()
+    Nothing is sent, so no hardware is needed. Run with
+        python -m lib.devices
+    """
+    import lib.ddp as ddp
+    pixels = np.random.randint(0, 256, (3, n_pixels)).astype(float)
+    lut = LUT()
+    # Gamma and white balance cost nothing extra, they are in the same table
+    lut.update(0.8, (255, 200, 150), 255, 2.2)
+    leds = lut.apply(pixels).copy()
+    previous = np.zeros(n_pixels, dtype=np.uint32)
+    # Stands in for the strip's _led_data, a list takes item assignment at about the same cost.
+    # Every LED changes from previous, so this is the slowest case, and the strip's show() isn't included.
+    led_data = [0] * n_pixels
+    ddp_frame = ddp.Frame(n_pixels)
+    encoders = {"colour LUT": lambda: lut.apply(pixels).tobytes(),
+                "ESP8266 raw/chunked": lambda: packets.chunk_frame(lut.apply(pixels).tobytes(), 0),
+                "ESP8266 compressed": lambda: packets.compress_frame(leds, 0),
+                "DDP": lambda: ddp_frame.encode(lut.apply(pixels).tobytes()),
+                "RaspberryPi": lambda: write_changed(led_data, grb_words(lut.apply(pixels)), previous),
+                "BlinkStick": lambda: grb_bytes(lut.apply(pixels)).tolist()}
+    for name, encode in encoders.items():
+        start = time.perf_counter()
+        for i in range(frames):
+            encode()
+        elapsed = (time.perf_counter() - start) / frames
+        print("{:<22} {:8.1f} us per frame, {:8.1f} us per 1000 LEDs".format(name, elapsed * 1e6, elapsed * 1e6 * 1000 / n_pixels))
 
-        self._sock.sendto(message, (self._ip, self._port))
 
+def benchmark_show(sizes=(300, 1000, 5000), frames=500):
+    """Print how many frames a second ESP8266 and DDP can send, for strips of each size
 
+    Frames go to a socket on localhost that nobody reads, so this measures
+    encoding and the send calls, not the network.
+    """
+    import socket
+    sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sink.bind(("127.0.0.1", 0))
+    port = sink.getsockname()[1]
+    print("{:<18} {:>6} {:>12} {:>10} {:>9}".format("device", "LEDs", "us/frame", "frames/s", "packets"))
+    for n_pixels in sizes:
+        # Alternate between two frames so none are skipped for repeating the last one
+        pixels = [np.random.randint(0, 256, (3, n_pixels)).astype(float) for i in range(2)]
+        ddp = DDP("127.0.0.1", n_pixels, port)
+        # Controller and the packets it sends per frame
+        controllers = {"ESP8266 raw": (ESP8266("127.0.0.1", n_pixels, port, protocol="raw"), 1),
+                       "ESP8266 chunked": (ESP8266("127.0.0.1", n_pixels, port, protocol="chunked"),
+                                           len(packets.chunk_frame(bytes(3 * n_pixels), 0))),
+                       "DDP": (ddp, len(ddp._frame.lengths))}
+        for name, (controller, n_packets) in controllers.items():
+            start = time.perf_counter()
+            for i in range(frames):
+                controller.show(pixels[i % 2])
+            elapsed = (time.perf_counter() - start) / frames
+            print("{:<18} {:>6} {:>12.1f} {:>10.0f} {:>9}".format(name, n_pixels, elapsed * 1e6, 1 / elapsed, n_packets))
 
 
+if __name__ == "__main__":
+    benchmark_encode()
+    benchmark_show()
@@ -0,0 +1,167 @@
+"""E1.31 (sACN) and Art-Net packets for pixel controllers that take DMX universes
+
+A universe carries 512 channels, so 170 r, g, b pixels. A board's pixels are
+split across consecutive universes. Every universe gets a preallocated packet
+whose header is filled in once, and each frame only writes its pixels and the
+sequence number in. With sync on, data packets name a sync universe and
+controllers hold them until the sync packet sent after the last universe, so a
+long run updates at once.
+
+Sink is a stand-in that counts what arrives, run one with
+    python -m lib.dmx 5568
+"""
+import struct
+import sys
+import time
+import uuid
+import numpy as np
+import lib.sink as sink
+
+PIXELS_PER_UNIVERSE = 170
+E131_PORT = 5568
+ARTNET_PORT = 6454
+
+E131_HEADER = 126
+ARTNET_HEADER = 18
+E131_SYNC = 49
+ARTNET_SYNC = 14
+
+
+def e131_template(universe, channels, cid, source, sync_universe=0, priority=100):
+    """E1.31 data packet for a universe with everything but the sequence number and data filled in"""
+    packet = bytearray(E131_HEADER + channels)
+    length = len(packet)
+    struct.pack_into(">HH12sHI16s", packet, 0, 0x0010, 0, b"ASC-E1.17", 0x7000 | (length - 16), 0x00000004, cid)
+    struct.pack_into(">HI64sBHBBH", packet, 38, 0x7000 | (length - 38), 0x00000002, source, priority, sync_universe, 0, 0, universe)
+    struct.pack_into(">HBBHHHB", packet, 115, 0x7000 | (length - 115), 0x02, 0xA1, 0, 1, channels + 1, 0)
+    return packet
+
+
+def e131_sync(cid, sync_universe, sequence):
+    packet = bytearray(E131_SYNC)
+    struct.pack_into(">HH12sHI16s", packet, 0, 0x0010, 0, b"ASC-E1.17", 0x7000 | (E131_SYNC - 16), 0x00000008, cid)
+    struct.pack_into(">HIBHH", packet, 38, 0x7000 | (E131_SYNC - 38), 0x00000001, sequence & 0xFF, sync_universe, 0)
+    return bytes(packet)
+
+
+def artnet_template(universe, channels):
+    """ArtDmx packet for a universe with everything but the sequence number and data filled in"""
+    packet = bytearray(ARTNET_HEADER + channels)
+    struct.pack_into("<8sH", packet, 0, b"Art-Net", 0x5000)
+    struct.pack_into(">HBBHH", packet, 10, 14, 0, 0, 0, channels)
+    struct.pack_into("<H", packet, 14, universe & 0x7FFF)
+    return packet
+
+
+def artnet_sync():
+    return struct.pack("<8sH", b"Art-Net", 0x5200) + struct.pack(">HBB", 14, 0, 0)
+
+
+def multicast_address(universe):
+    """E1.31 multicast group of a universe"""
+    return "239.255.{}.{}".format(universe >> 8, universe & 0xFF)
+
+
+class Frame():
+    """Preallocated packets for every universe of a board
+
+    Rows of one array hold the packets, so a whole frame of pixels is copied
+    in with a single assignment.
+    """
+    def __init__(self, n_pixels, first_universe=1, protocol="e131", sync_universe=0, source="dirty-leds"):
+        if protocol not in ("e131", "artnet"):
+            raise ValueError("Invalid DMX protocol {}".format(protocol))
+        self.protocol = protocol
+        self.n_pixels = n_pixels
+        self.universes = list(range(first_universe, first_universe + -(-n_pixels // PIXELS_PER_UNIVERSE)))
+        self.sync_universe = sync_universe
+        self.cid = uuid.uuid4().bytes
+        self.header = E131_HEADER if protocol == "e131" else ARTNET_HEADER
+        # Sequence number offset in the header
+        self._sequence = 111 if protocol == "e131" else 12
+        channels = 3 * PIXELS_PER_UNIVERSE
+        self.lengths = [self.header + 3 * min(PIXELS_PER_UNIVERSE, n_pixels - i * PIXELS_PER_UNIVERSE)
+                        for i in range(len(self.universes))]
+        if protocol == "artnet":
+            # ArtDmx data has to be an even number of channels
+            self.lengths = [length + length % 2 for length in self.lengths]
+        self.packets = np.zeros((len(self.universes), self.header + channels), dtype=np.uint8)
+        source = source.encode()[:63]
+        for row, (universe, length) in enumerate(zip(self.universes, self.lengths)):
+            if protocol == "e131":
+                template = e131_template(universe, length - self.header, self.cid, source, sync_universe)
+            else:
+                template = artnet_template(universe, length - self.header)
+            self.packets[row, :length] = np.frombuffer(template, dtype=np.uint8)
+        # Pixels padded out to whole universes, viewed as rows of r, g, b channels
+        self._data = np.zeros(len(self.universes) * channels, dtype=np.uint8)
+        self.sequence = 0
+
+    def encode(self, rgb):
+        """Return the packets of a frame from its r, g, b bytes, followed by a sync packet if syncing"""
+        self.sequence = (self.sequence + 1) & 0xFF
+        # Art-Net reserves 0 for "sequencing off"
+        if self.protocol == "artnet" and self.sequence == 0:
+            self.sequence = 1
+        self._data[:len(rgb)] = np.frombuffer(rgb, dtype=np.uint8)
+        self.packets[:, self.header:] = self._data.reshape(len(self.universes), -1)
+        self.packets[:, self._sequence] = self.sequence
+        frame = [row[:length].tobytes() for row, length in zip(self.packets, self.lengths)]
+        if self.sync_universe:
+            frame.append(e131_sync(self.cid, self.sync_universe, self.sequence) if self.protocol == "e131" else artnet_sync())
+        return frame
+
+
+class Sink(sink.Sink):
+    """Stand-in DMX controller that counts packets and times frames
+
+    Frames are timed by the sync packets, or without sync by the packets for
+    the first universe seen.
+    """
+    def __init__(self, port=0, host="127.0.0.1"):
+        super().__init__(port, host)
+        self.universes = {}     # universe: data packets received for it
+        self.data = {}          # universe: channels of the last data packet for it
+        self.syncs = 0
+        self.bad = 0            # Packets that aren't E1.31 or Art-Net
+
+    def serve(self):
+        first = None
+        while True:
+            packet = self.sock.recv(2048)
+            now = time.monotonic()
+            universe = None
+            if packet[4:13] == b"ASC-E1.17" and len(packet) >= E131_SYNC:
+                vector = struct.unpack_from(">I", packet, 18)[0]
+                if vector == 0x00000008:
+                    self.syncs += 1
+                    self.frame_times.append(now)
+                    continue
+                if vector == 0x00000004 and len(packet) >= E131_HEADER:
+                    universe = struct.unpack_from(">H", packet, 113)[0]
+                    self.data[universe] = packet[E131_HEADER:]
+            elif packet[:8] == b"Art-Net\0" and len(packet) >= ARTNET_SYNC:
+                opcode = struct.unpack_from("<H", packet, 8)[0]
+                if opcode == 0x5200:
+                    self.syncs += 1
+                    self.frame_times.append(now)
+                    continue
+                if opcode == 0x5000 and len(packet) >= ARTNET_HEADER:
+                    universe = struct.unpack_from("<H", packet, 14)[0]
+                    self.data[universe] = packet[ARTNET_HEADER:]
+            if universe is None:
+                self.bad += 1
+                continue
+            self.universes[universe] = self.universes.get(universe, 0) + 1
+            if first is None:
+                first = universe
+            if universe == first and not self.syncs:
+                self.frame_times.append(now)
+
+    def report(self):
+        return "{} universes, {} packets, {} syncs, {} bad, {}".format(
+            len(self.universes), sum(self.universes.values()), self.syncs, self.bad, self.intervals())
+
+
+if __name__ == "__main__":
+    sink.run(Sink(int(sys.argv[1]), "0.0.0.0"))
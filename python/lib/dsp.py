@@ -31,6 +31,53 @@ class ExpFilter:
 
 
 
+class AudioAnalyser():
+    """Rolling window FFT shared by every board
+
+    The window length, FFT size and sample rate only depend on the global
+    configuration, so the spectrum is the same for every board. It is computed
+    once per audio frame here and each board's DSP only applies its own mel
+    filterbank to the result.
+    """
+    def __init__(self):
+        # Number of audio samples to read every time frame
+        self.samples_per_frame = int(config.settings["configuration"]["MIC_RATE"] / config.settings["configuration"]["FPS"])
+        window_length = self.samples_per_frame * config.settings["configuration"]["N_ROLLING_HISTORY"]
+        # Circular buffer containing the rolling audio sample window, the oldest block starts at ring_pos
+        self.ring =            (np.random.rand(window_length) / 1e16).astype(np.float32)
+        self.ring_pos = 0
+        self.fft_window =      np.hamming(window_length).astype(np.float32)
+        # FFT input, zero padded to the next power of two. Only the first window_length samples are ever rewritten
+        self.fft_input =       np.zeros(2**int(np.ceil(np.log2(window_length))), dtype=np.float32)
+        # FFT magnitudes handed to every board, always float64 so the mel projection can gather into a fixed buffer
+        self.fft_magnitude =   np.zeros(window_length // 2)
+
+    def update(self, audio_samples):
+        """ Return the spectrum of the rolling audio window
+
+        This is called once every time there is a microphone update, and the
+        result is handed to DSP.update for each board
+
+        Returns
+        -------
+        spectrum : dict
+            Dict containing "fft" (FFT magnitudes) and "vol" (peak volume)
+        """
+        N = len(self.ring)
+        # Normalize samples between 0 and 1, overwriting the oldest block of the window
+        pos = self.ring_pos
+        np.multiply(audio_samples, 1.0 / 2.0**15, out=self.ring[pos:pos + self.samples_per_frame])
+        pos = self.ring_pos = (pos + self.samples_per_frame) % N
+        vol = max(self.ring.max(), -self.ring.min())
+        # Unroll the window into the FFT input oldest sample first, applying the window function on the way
+        tail = N - pos
+        np.multiply(self.ring[pos:], self.fft_window[:tail], out=self.fft_input[:tail])
+        np.multiply(self.ring[:pos], self.fft_window[tail:], out=self.fft_input[tail:N])
+        # Transform audio input into the frequency domain
+        YS = np.abs(np.fft.rfft(self.fft_input)[:N // 2], out=self.fft_magnitude)
+        return {"fft": YS, "vol": vol}
+
+
 class DSP():
     def __init__(self, board):
         self.board = board
@@ -49,24 +96,19 @@ class DSP():
         self.volume =          ExpFilter(config.settings["configuration"]["MIN_VOLUME_THRESHOLD"], alpha_decay=0.02, alpha_rise=0.02)
         self.p =               np.tile(1.0, (3, self.board.config["N_PIXELS"] // 2))
         
-        # Number of audio samples to read every time frame
-        self.samples_per_frame = int(config.settings["configuration"]["MIC_RATE"] / config.settings["configuration"]["FPS"])
-        # Array containing the rolling audio sample window
-        self.y_roll = np.random.rand(config.settings["configuration"]["N_ROLLING_HISTORY"], self.samples_per_frame) / 1e16
-        self.fft_window =      np.hamming(int(config.settings["configuration"]["MIC_RATE"] / config.settings["configuration"]["FPS"])\
-                                         * config.settings["configuration"]["N_ROLLING_HISTORY"])
-
         self.samples = None
         self.mel_y = None
         self.mel_x = None
+        self.mel_bands = None
         self.create_mel_bank()
 
-    def update(self, audio_samples):
+    def update(self, spectrum):
         """ Return processed audio data
 
         Returns mel curve, x/y data
 
-        This is called every time there is a microphone update
+        This is called every time there is a microphone update, with the
+        shared spectrum returned by AudioAnalyser.update
 
         Returns
         -------
@@ -75,24 +117,14 @@ class DSP():
         """
 
         audio_data = {}
-        # Normalize samples between 0 and 1
-        y = audio_samples / 2.0**15
-        # Construct a rolling window of audio samples
-        self.y_roll[:-1] = self.y_roll[1:]
-        self.y_roll[-1, :] = np.copy(y)
-        y_data = np.concatenate(self.y_roll, axis=0).astype(np.float32)
-        vol = np.max(np.abs(y_data))
-        # Transform audio input into the frequency domain
-        N = len(y_data)
-        N_zeros = 2**int(np.ceil(np.log2(N))) - N
-        # Pad with zeros until the next power of two
-        y_data *= self.fft_window
-        y_padded = np.pad(y_data, (0, N_zeros), mode='constant')
-        YS = np.abs(np.fft.rfft(y_padded)[:N // 2])
-        # Construct a Mel filterbank from the FFT data
-        mel = np.atleast_2d(YS).T * self.mel_y.T
+        YS = spectrum["fft"]
+        vol = spectrum["vol"]
+        # Construct a Mel filterbank from the FFT data, only touching the bins each band covers
+        index, weights, starts, bins, mel = self.mel_bands
+        np.take(YS, index, out=bins)
+        bins *= weights
+        np.add.reduceat(bins, starts, out=mel)
         # Scale data to values more suitable for visualization
-        mel = np.sum(mel, axis=0)
         mel = mel**2.0
         # Gain normalization
         self.mel_gain.update(np.max(gaussian_filter1d(mel, sigma=1.0)))
@@ -129,4 +161,19 @@ class DSP():
                                                              freq_max=self.board.config["MAX_FREQUENCY"],
                                                              num_fft_bands=samples,
                                                              sample_rate=config.settings["configuration"]["MIC_RATE"])
+        # Each triangular filter only covers a narrow run of FFT bins, so keep just those weights back to back
+        # and sum them per band. Empty bands keep a single zero weight so reduceat still sees a non-empty run.
+        index, weights, starts = [], [], []
+        for band in self.mel_y:
+            nonzero = np.flatnonzero(band)
+            start, stop = (nonzero[0], nonzero[-1] + 1) if len(nonzero) else (0, 1)
+            starts.append(len(index))
+            index.extend(range(start, stop))
+            weights.extend(band[start:stop])
+        # Swapped in as one tuple so a rebuild from the API thread never mixes old and new bands
+        self.mel_bands = (np.array(index, dtype=np.intp),
+                          np.array(weights),
+                          np.array(starts, dtype=np.intp),
+                          np.zeros(len(index)),
+                          np.zeros(len(self.mel_y)))
 
@@ -0,0 +1,218 @@
+"""Emulates ESP8266 controllers on local UDP ports, for testing the output path without hardware
+
+Every emulated controller decodes packets with lib/receiver.py, like
+ws2812_controller.ino would, and records how they arrived. Emulate 12 strips
+of 300 LEDs on ports 7778 to 7789, printing stats every 5 seconds:
+    python -m lib.emulator 300 7778 12
+Point devices in config.json at 127.0.0.1 and those ports, or add --load FPS
+to have the emulator send random frames to itself through devices.ESP8266:
+    python -m lib.emulator 300 7778 12 --load 60
+With --multicast the controllers also join a multicast group, as boards in a
+MulticastGroup do, and --load sends every frame to the group once:
+    python -m lib.emulator 300 7778 4 --multicast 239.255.0.1:7999 --load 60
+"""
+import argparse
+import selectors
+import socket
+import threading
+import time
+import numpy as np
+from lib.receiver import Receiver
+import lib.packets as packets
+
+
+def join(group, interface):
+    """Return a socket that takes what is sent to a multicast (address, port) group on an interface"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    # Every controller in the group binds the same address and gets its own copy
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(group)
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, socket.inet_aton(group[0]) + socket.inet_aton(interface))
+    sock.setblocking(False)
+    return sock
+
+
+class EmulatedController():
+    def __init__(self, n_pixels, port, host="127.0.0.1", group=None):
+        """group is a multicast (address, port) to take frames from as well, joined on host"""
+        self.port = port
+        self.receiver = Receiver(n_pixels)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.sock.setblocking(False)
+        self.sockets = [self.sock] if group is None else [self.sock, join(group, host)]
+        self.reset()
+
+    def reset(self):
+        """Start a new measuring period"""
+        self.started = time.monotonic()
+        self.packets = 0
+        self.bytes = 0
+        self.missed = 0         # Frames whose id was skipped over, so none of their packets arrived
+        self._frames = self.receiver.frames
+        self._invalid = self.receiver.invalid
+        self._incomplete = self.receiver.incomplete
+        self._last_id = None
+        self._last_arrival = None
+        # Running mean and variance of the time between frames (Welford)
+        self._intervals = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self.max_interval = 0.0
+
+    def read(self, sock):
+        """Handle every datagram waiting on one of the sockets"""
+        while True:
+            try:
+                packet, address = sock.recvfrom(65536)
+            except (BlockingIOError, InterruptedError):
+                return
+            reply = self.receiver.reply(packet)
+            if reply is not None:
+                self.sock.sendto(reply, address)
+                continue
+            self.packets += 1
+            self.bytes += len(packet)
+            self._track_id(packet)
+            frames = self.receiver.frames
+            self.receiver.receive(packet)
+            if self.receiver.frames > frames:
+                self._arrived()
+
+    def poll(self):
+        frames = self.receiver.frames
+        self.receiver.poll()
+        if self.receiver.frames > frames:
+            self._arrived()
+
+    def _track_id(self, packet):
+        # Headed frames are numbered, a gap in the numbers is a frame that never arrived at all
+        if len(packet) == self.receiver.n_pixels * 3 or len(packet) < packets.HEADER.size or packet[0] != packets.MAGIC:
+            return
+        frame = packet[2]
+        if self._last_id is not None and frame != self._last_id:
+            gap = (frame - self._last_id) & 0xFF
+            if gap < 0x80:
+                self.missed += gap - 1
+        self._last_id = frame
+
+    def _arrived(self):
+        now = time.monotonic()
+        if self._last_arrival is not None:
+            interval = now - self._last_arrival
+            self._intervals += 1
+            delta = interval - self._mean
+            self._mean += delta / self._intervals
+            self._m2 += delta * (interval - self._mean)
+            self.max_interval = max(self.max_interval, interval)
+        self._last_arrival = now
+
+    def stats(self):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        frames = self.receiver.frames - self._frames
+        incomplete = self.receiver.incomplete - self._incomplete
+        return {"port": self.port,
+                "fps": frames / elapsed,
+                "packets_per_second": self.packets / elapsed,
+                "bytes_per_second": self.bytes / elapsed,
+                "jitter": np.sqrt(self._m2 / self._intervals) if self._intervals > 1 else 0.0,
+                "max_interval": self.max_interval,
+                "size_errors": self.receiver.invalid - self._invalid,
+                "dropped": self.missed + incomplete,
+                "stale": self.receiver.stale,
+                "late": self.receiver.late}
+
+
+class Emulator():
+    """Any number of emulated controllers served from one thread"""
+    def __init__(self, n_pixels, first_port, count=1, host="127.0.0.1", group=None):
+        self.host = host
+        self.group = group
+        self.controllers = [EmulatedController(n_pixels, first_port + i, host, group) for i in range(count)]
+        self.selector = selectors.DefaultSelector()
+        for controller in self.controllers:
+            for sock in controller.sockets:
+                self.selector.register(sock, selectors.EVENT_READ, controller)
+        self.running = False
+
+    def run(self, duration=None):
+        """Serve the controllers, for duration seconds or until stop is called"""
+        self.running = True
+        end = None if duration is None else time.monotonic() + duration
+        while self.running and (end is None or time.monotonic() < end):
+            # Wake up in time for the next timed frame due on any controller
+            dues = [due for due in (c.receiver.until_due() for c in self.controllers) if due is not None]
+            timeout = min(dues + [0.1])
+            for key, events in self.selector.select(timeout):
+                key.data.read(key.fileobj)
+            for controller in self.controllers:
+                controller.poll()
+
+    def stop(self):
+        self.running = False
+
+    def reset(self):
+        for controller in self.controllers:
+            controller.reset()
+
+    def report(self):
+        lines = ["port     fps  packets/s   kbytes/s  jitter ms   max ms  size errors  dropped"]
+        for stats in (controller.stats() for controller in self.controllers):
+            lines.append("{:<5} {:6.1f} {:10.1f} {:10.1f} {:10.2f} {:8.2f} {:12d} {:8d}".format(
+                stats["port"], stats["fps"], stats["packets_per_second"], stats["bytes_per_second"] / 1000,
+                stats["jitter"] * 1000, stats["max_interval"] * 1000, stats["size_errors"], stats["dropped"]))
+        return "\n".join(lines)
+
+
+def load(emulator, fps, protocol="chunked", duration=None):
+    """Send random frames to every emulated controller through devices.ESP8266 and one OutputBatch
+
+    If the emulator has a multicast group every frame is sent to the group once instead.
+    """
+    import lib.devices as devices
+    from lib.output import OutputBatch
+    output = OutputBatch(multicast_interface=emulator.host)
+    leds = emulator.controllers[0].receiver.n_pixels
+    if emulator.group is not None:
+        esps = [devices.ESP8266(ip=emulator.group[0], port=emulator.group[1], leds=leds, protocol=protocol, output=output)]
+    else:
+        esps = [devices.ESP8266(ip=emulator.host, port=c.port, leds=leds, protocol=protocol, output=output)
+                for c in emulator.controllers]
+    pixels = np.random.randint(0, 256, (3, leds))
+    next_frame = time.monotonic()
+    end = None if duration is None else next_frame + duration
+    while emulator.running and (end is None or next_frame < end):
+        pixels[:, np.random.randint(0, leds, leds // 10)] = np.random.randint(0, 256, (3, leds // 10))
+        for esp in esps:
+            esp.show(pixels)
+        output.flush()
+        next_frame += 1.0 / fps
+        time.sleep(max(0.0, next_frame - time.monotonic()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Emulate ESP8266 LED controllers on local UDP ports")
+    parser.add_argument("leds", type=int, help="LEDs on every emulated strip")
+    parser.add_argument("port", type=int, help="Port of the first controller, the rest follow on")
+    parser.add_argument("count", type=int, nargs="?", default=1, help="Number of controllers")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--interval", type=float, default=5.0, help="Seconds between reports")
+    parser.add_argument("--load", type=float, metavar="FPS", help="Also send random frames to the controllers at this rate")
+    parser.add_argument("--protocol", default="chunked", help="Protocol the --load frames are sent with")
+    parser.add_argument("--multicast", metavar="ADDRESS:PORT", help="Multicast group the controllers also join")
+    args = parser.parse_args()
+    group = None
+    if args.multicast:
+        address, _, port = args.multicast.partition(":")
+        group = (address, int(port))
+    emulator = Emulator(args.leds, args.port, args.count, args.host, group)
+    emulator.running = True
+    if args.load:
+        threading.Thread(target=load, args=(emulator, args.load, args.protocol), daemon=True).start()
+    try:
+        while True:
+            emulator.run(args.interval)
+            print(emulator.report())
+            emulator.reset()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,110 @@
+import hashlib
+import os
+import numpy as np
+
+_gradients = {}
+"""Generated gradients, keyed by (colors, length, slope)"""
+
+_wrapped = {}
+"""Doubled copies of gradients handed to ScrollingGradient, keyed by id of the gradient"""
+
+
+def _easing(length, slope):
+    # Eased curve from 0 to 1 over length steps, steeper in the middle for larger slopes
+    x = np.arange(length) / length
+    xa = x**slope
+    return xa / (xa + (1 - x)**slope)
+
+
+def _generate_gradient(colors, length, slope):
+    colors = np.array(colors[::-1], dtype=float).T # needs to be reversed, makes it easier to deal with
+    n_transitions = colors.shape[1] - 1
+    ease_length = length // n_transitions
+    pad = length - (n_transitions * ease_length)
+    # Every transition at once: (3, transitions, 1) start values plus differences scaled by the (ease_length,) curve
+    start = colors[:, :-1, np.newaxis]
+    diff = colors[:, 1:, np.newaxis] - start
+    output = np.empty((3, length), dtype=int)
+    output[:, :n_transitions * ease_length] = (start + diff * _easing(ease_length, slope)).reshape(3, -1)
+    # pad out the ends (bit messy but it works and looks good)
+    if pad:
+        output[:, -pad:] = output[:, -pad-1:-pad]
+    return np.concatenate((output[:, ::-1], output), axis=1)
+
+
+def easing_gradient(colors, length, slope=2.5, cache_dir=None):
+    """Return a gradient easing between colors, mirrored in front of itself
+
+    Gradients are generated once per process and shared, so the returned array
+    is read only. If cache_dir is given they are also kept there as .npy files
+    between runs.
+
+    Parameters
+    ----------
+    colors : list
+        (r, g, b) tuples to ease between, eg. [(255, 0, 0), (0, 0, 255)]
+    length : int
+        Length of the gradient, usually the board's N_PIXELS
+    slope : float
+        Steepness of each transition
+
+    Returns
+    -------
+    gradient : np.array
+        (3, 2 * length) int array, the reversed gradient followed by the gradient
+    """
+    key = (tuple(tuple(color) for color in colors), length, slope)
+    if key in _gradients:
+        return _gradients[key]
+    path = None
+    if cache_dir is not None:
+        path = os.path.join(cache_dir, "gradient-{}.npy".format(hashlib.sha1(repr(key).encode()).hexdigest()[:16]))
+    if path is not None and os.path.isfile(path):
+        gradient = np.load(path)
+    else:
+        gradient = _generate_gradient(colors, length, slope)
+        if path is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            np.save(path, gradient)
+    gradient.flags.writeable = False
+    _gradients[key] = gradient
+    return gradient
+
+
+def _wrap(colors):
+    # The stored gradient keeps colors alive, so its id can't be reused by another array
+    stored = _wrapped.get(id(colors))
+    if stored is None or stored[0] is not colors:
+        wrapped = np.concatenate((colors, colors), axis=1)
+        wrapped.flags.writeable = False
+        stored = _wrapped[id(colors)] = (colors, wrapped)
+    return stored[1]
+
+
+class ScrollingGradient():
+    """Colour gradient that effects can scroll without copying it
+
+    The (3, n) gradient is stored twice side by side, so a window of up to n
+    pixels starting anywhere in it is a plain slice. Every effect keeps its own
+    scroll phase, so two effects using the same gradient on a board no longer
+    move it for each other.
+    """
+    def __init__(self, colors):
+        self.length = colors.shape[1]
+        self.wrapped = _wrap(colors)
+        self.phases = {}
+
+    def roll(self, name, shift):
+        """Scroll the gradient seen by name, same direction as np.roll(gradient, shift, axis=1)"""
+        self.phases[name] = (self.phases.get(name, 0) - shift) % self.length
+
+    def view(self, name, length=None, start=0):
+        """Return a read only (3, length) view of the gradient as scrolled by name
+
+        start offsets the window into the gradient. length can't be more than
+        the gradient length
+        """
+        if length is None:
+            length = self.length
+        offset = (self.phases.get(name, 0) + start) % self.length
+        return self.wrapped[:, offset:offset + length]
@@ -0,0 +1,73 @@
+"""Colour lookup table that turns rendered pixels into the bytes a device is sent
+
+Brightness, gamma correction, white balance and the maxBrightness cap are all
+folded into one table per channel, so encoding a frame is a single np.take
+whatever is switched on. Pixels are floats, effects can go well past 255, and
+are multiplied by the brightness before they are clipped to 255 and looked up.
+The table has STEPS entries for every step of 1 so the fractions still count
+before gamma.
+"""
+import numpy as np
+
+STEPS = 16
+SIZE = 256 * STEPS
+
+
+class LUT():
+    def __init__(self, clip=255):
+        """clip is the largest value pixels are clipped to after brightness and before gamma"""
+        self.clip = clip
+        self.settings = None    # (brightness, white balance, max brightness, gamma) the table was built for
+        self.builds = 0         # Times the table was built
+        self._offsets = np.arange(3).reshape(3, 1) * SIZE
+        self._scaled = None
+        self._scale = STEPS     # Pixels times this are the index into the table, brightness included
+        self.update()
+
+    def update(self, brightness=1.0, white_balance=(1, 1, 1), max_brightness=255, gamma=None):
+        """Rebuild the table if any of the settings changed, returns True if it was rebuilt
+
+        Parameters
+        ----------
+        brightness: float, optional
+            Every pixel is multiplied by this first.
+        white_balance: tuple, optional
+            r, g, b gains, scaled so the largest is 1.
+        max_brightness: int, optional
+            Largest value any channel is sent as.
+        gamma: float, optional
+            Exponent of the gamma correction, None for none.
+        """
+        white = np.array(white_balance, dtype=float)
+        white = white / white.max() if white.max() > 0 else np.ones(3)
+        settings = (brightness, tuple(white), max_brightness, gamma)
+        if settings == self.settings:
+            return False
+        self.settings = settings
+        # Brightness scales the index, so pixels past 255 still count until they are brighter than 255
+        self._scale = STEPS * brightness
+        values = np.minimum(np.arange(SIZE) / STEPS, self.clip)
+        if gamma is not None:
+            values = 255 * (values / 255) ** gamma
+        table = np.minimum(white.reshape(3, 1) * values, max_brightness).clip(0, 255)
+        self.table = table.astype(np.uint8).ravel()
+        self.builds += 1
+        return True
+
+    def apply(self, pixels):
+        """Return a (3, n) pixel array as (n, 3) r, g, b rows of uint8
+
+        The rows are a buffer that the next call overwrites.
+        """
+        if self._scaled is None or self._scaled.shape != pixels.shape:
+            # float32 is plenty for 4096 steps and halves what the multiply and clip write
+            self._scaled = np.empty(pixels.shape, dtype=np.float32)
+            self._index = np.empty(pixels.shape, dtype=np.intp)
+            self._rgb = np.empty(pixels.shape[::-1], dtype=np.uint8)
+        np.multiply(pixels, self._scale, out=self._scaled)
+        np.clip(self._scaled, 0, SIZE - 1, out=self._scaled)
+        # Truncates like casting the pixels to uint8 does, then picks each channel's part of the table
+        self._index[...] = self._scaled
+        self._index += self._offsets
+        np.take(self.table, self._index.T, out=self._rgb, mode="clip")
+        return self._rgb
@@ -1,10 +1,79 @@
 import time
+import threading
+from collections import deque
 import numpy as np
 import pyaudio
 import config
 
 
-def start_stream(callback):
+class FrameQueue():
+    """Bounded ring of audio blocks passed from the capture thread to the renderer
+
+    deque.append and deque.popleft are atomic, so neither thread ever waits on a
+    lock held by the other. If the renderer falls behind, the capture thread
+    overwrites the oldest block and the renderer skips straight to the newest one.
+    """
+    def __init__(self, size):
+        self.blocks = deque(maxlen=size)
+        self.ready = threading.Event()
+        # Each counter is only written by one thread
+        self.captured = 0       # Blocks read from the sound card (capture thread)
+        self.overwritten = 0    # Blocks pushed out of a full ring (capture thread)
+        self.skipped = 0        # Stale blocks discarded in favour of a newer one (render thread)
+        self.late = 0           # Frames that took longer than one frame period to render (render thread)
+        self.errors = 0         # Frames whose rendering or sending failed with an OSError (render thread)
+        self.error = None       # Exception that stopped the capture thread, if it stopped
+
+    @property
+    def dropped(self):
+        return self.overwritten + self.skipped
+
+    def put(self, block):
+        if len(self.blocks) == self.blocks.maxlen:
+            self.overwritten += 1
+        self.blocks.append(block)
+        self.captured += 1
+        self.ready.set()
+
+    def fail(self, error):
+        """Called by the capture thread when it stops, wakes the renderer to report it"""
+        self.error = error
+        self.ready.set()
+
+    def latest(self, timeout=None):
+        """Return the newest block, discarding any older ones, or None on timeout"""
+        if not self.ready.wait(timeout):
+            return None
+        self.ready.clear()
+        block = None
+        while True:
+            try:
+                newer = self.blocks.popleft()
+            except IndexError:
+                return block
+            if block is not None:
+                self.skipped += 1
+            block = newer
+
+    def stats(self):
+        return {"captured": self.captured,
+                "dropped": self.dropped,
+                "late": self.late,
+                "errors": self.errors}
+
+
+frames = FrameQueue(config.settings["configuration"]["AUDIO_QUEUE_SIZE"])
+
+
+def capture_stream(queue):
+    try:
+        _capture(queue)
+    except Exception as error:
+        # The renderer raises it, with its traceback
+        queue.fail(error)
+
+
+def _capture(queue):
     p = pyaudio.PyAudio()
     frames_per_buffer = int(config.settings["configuration"]["MIC_RATE"] / config.settings["configuration"]["FPS"])
     stream = p.open(format=pyaudio.paInt16,
@@ -18,7 +87,7 @@ def start_stream(callback):
         try:
             y = np.frombuffer(stream.read(frames_per_buffer, exception_on_overflow=False), dtype=np.int16)
             y = y.astype(np.float32)
-            callback(y)
+            queue.put(y)
         except IOError:
             overflows += 1
             if time.time() > prev_ovf_time + 1:
@@ -27,3 +96,33 @@ def start_stream(callback):
     stream.stop_stream()
     stream.close()
     p.terminate()
+
+
+def start_stream(callback):
+    """Capture audio on its own thread and call callback with the latest block
+
+    Only the newest block is rendered; anything older that piled up while the
+    previous frame was rendering is dropped rather than processed late.
+    A send failing, say while Wi-Fi is down, only costs that frame. Raises
+    RuntimeError if the capture thread stops.
+    """
+    capture = threading.Thread(target=capture_stream, args=(frames,), daemon=True)
+    capture.start()
+    frame_time = 1.0 / config.settings["configuration"]["FPS"]
+    prev_error_time = 0.0
+    while True:
+        y = frames.latest(timeout=1.0)
+        if frames.error is not None:
+            raise RuntimeError("Audio capture stopped") from frames.error
+        if y is None:
+            continue
+        start = time.time()
+        try:
+            callback(y)
+        except OSError as error:
+            frames.errors += 1
+            if time.time() > prev_error_time + 1:
+                prev_error_time = time.time()
+                print('Sending a frame failed ({} times so far): {}'.format(frames.errors, error))
+        if time.time() - start > frame_time:
+            frames.late += 1
@@ -0,0 +1,194 @@
+"""Open Pixel Control, as spoken by Fadecandy's fcserver
+
+Every message is a 4 byte header and its data:
+    |channel|command|length (2 bytes, big endian)|data|
+where command 0 sets pixel colours and data is length bytes of r, g, b.
+Boards on the same server share one persistent TCP connection, and the
+messages of all their channels for a frame go out in a single write, once
+every channel has one or when flush() ends the frame. Connecting happens on
+a thread of its own, frames until it succeeds are dropped.
+
+Sink is a stand-in server that records what it is sent, run one with
+    python -m lib.opc 7890
+"""
+import socket
+import struct
+import sys
+import threading
+import time
+import lib.sink as sink
+
+HEADER = struct.Struct(">BBH")
+SET_PIXEL_COLOURS = 0
+
+RECONNECT_INTERVAL = 1.0
+"""Seconds to wait before trying a server again after failing to connect"""
+
+CONNECT_TIMEOUT = 1.0
+"""Seconds a connection attempt may take"""
+
+WRITE_TIMEOUT = 0.1
+"""Seconds a write may block before the connection is given up as stuck"""
+
+
+def message(channel, rgb):
+    return HEADER.pack(channel, SET_PIXEL_COLOURS, len(rgb)) + rgb
+
+
+class Connection():
+    """Persistent connection to one OPC server, shared by every channel on it"""
+    def __init__(self, host, port):
+        self.address = (host, port)
+        self.channels = set()   # Channels of the boards using this connection
+        self.frames = 0         # Writes made, one per frame with every channel in it
+        self.failures = 0       # Failed connection attempts and writes
+        self._sock = None
+        self._retry_at = 0.0
+        self._connecting = False
+        self._queued = {}       # channel: message waiting for the rest of the frame
+        self._lock = threading.Lock()
+
+    def attach(self, channel):
+        self.channels.add(channel)
+
+    def queue(self, channel, rgb):
+        """Add a channel's frame, writing the whole frame once every channel has one"""
+        with self._lock:
+            if channel in self._queued:
+                # A board is a frame ahead of the others, don't hold it back any longer
+                self._write()
+            self._queued[channel] = message(channel, rgb)
+            if self.channels.issubset(self._queued):
+                self._write()
+
+    def flush(self):
+        with self._lock:
+            self._write()
+
+    def _write(self):
+        queued, self._queued = self._queued, {}
+        if not queued or not self._connect():
+            return
+        try:
+            self._sock.sendall(b"".join(queued.values()))
+            self.frames += 1
+        except OSError:
+            # Part of a message may have gone out, so the stream can't be trusted any more
+            self.failures += 1
+            self._close()
+
+    def _connect(self):
+        """Return True if connected, otherwise start connecting unless it is too soon to try again"""
+        if self._sock is not None:
+            return True
+        if not self._connecting and time.monotonic() >= self._retry_at:
+            # Connecting can take as long as CONNECT_TIMEOUT, which the render loop can't wait for
+            self._connecting = True
+            threading.Thread(target=self._open, daemon=True).start()
+        return False
+
+    def _open(self):
+        try:
+            sock = socket.create_connection(self.address, timeout=CONNECT_TIMEOUT)
+        except OSError:
+            with self._lock:
+                self.failures += 1
+                self._retry_at = time.monotonic() + RECONNECT_INTERVAL
+                self._connecting = False
+            return
+        sock.settimeout(WRITE_TIMEOUT)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self._lock:
+            self._sock = sock
+            self._connecting = False
+
+    def _close(self):
+        self._sock.close()
+        self._sock = None
+        self._retry_at = time.monotonic() + RECONNECT_INTERVAL
+
+    def close(self):
+        with self._lock:
+            if self._sock is not None:
+                self._sock.close()
+                self._sock = None
+
+
+_connections = {}
+"""Connection for every server, keyed by "host:port" """
+
+
+def connection(server):
+    """Return the shared Connection to a "host:port" server, port defaulting to 7890"""
+    if server not in _connections:
+        host, _, port = server.partition(":")
+        _connections[server] = Connection(host, int(port or 7890))
+    return _connections[server]
+
+
+def flush():
+    """Write what every connection has queued, called once a frame has been shown on every board
+
+    Boards that skipped the frame queue nothing, so without this the others
+    would wait for their next frame.
+    """
+    for conn in _connections.values():
+        conn.flush()
+
+
+class Sink(sink.Sink):
+    """Stand-in OPC server that keeps the last frame of every channel"""
+    def __init__(self, port=0, host="127.0.0.1"):
+        super().__init__(port, host, socket.SOCK_STREAM)
+        self.channels = {}      # channel: data of the last message for it
+        self.messages = 0
+        self.reads = 0          # recv calls that returned data, one write usually arrives in one
+        self.connections = 0
+        self._open = set()      # Connections being read
+
+    def serve(self):
+        """Accept connections forever, each on its own thread"""
+        while True:
+            conn, address = self.sock.accept()
+            self.connections += 1
+            threading.Thread(target=self._read, args=(conn,), daemon=True).start()
+
+    def disconnect(self):
+        """Drop every open connection, as a server that restarted would"""
+        for conn in list(self._open):
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def report(self):
+        return "{} connections, {} messages, {} reads, channels {}".format(
+            self.connections, self.messages, self.reads, sorted(self.channels))
+
+    def _read(self, conn):
+        buffer = b""
+        self._open.add(conn)
+        with conn:
+            while True:
+                try:
+                    data = conn.recv(65536)
+                except OSError:
+                    # Reset by a client that gave up on the connection
+                    data = b""
+                if not data:
+                    self._open.discard(conn)
+                    return
+                self.reads += 1
+                buffer += data
+                while len(buffer) >= HEADER.size:
+                    channel, command, length = HEADER.unpack_from(buffer)
+                    if len(buffer) < HEADER.size + length:
+                        break
+                    if command == SET_PIXEL_COLOURS:
+                        self.channels[channel] = buffer[HEADER.size:HEADER.size + length]
+                    self.messages += 1
+                    buffer = buffer[HEADER.size + length:]
+
+
+if __name__ == "__main__":
+    sink.run(Sink(int(sys.argv[1]), "0.0.0.0"))
@@ -0,0 +1,371 @@
+"""Output stage that sends the packets of every device for a frame in one batch
+
+Devices given an OutputBatch queue their packets with add() instead of sending
+them, and main flushes the batch once every board has been rendered. All the
+packets go out of one socket, with a single sendmmsg call on Linux, so synced
+strips update as close together as possible. Where sendmmsg isn't available
+the batch falls back to one sendto per packet.
+
+OutputEngine takes the same add() and flush() calls but only hands the frame
+to an asyncio loop on its own thread, which sends it to each device when that
+device is ready for it, so a slow or unreachable controller never holds up
+rendering or the other controllers. Given a stagger it also spreads the
+devices' sends out over that many seconds instead of sending them back to
+back, so controllers sharing a Wi-Fi channel don't all contend for airtime in
+the same millisecond.
+"""
+import asyncio
+import ctypes
+import ctypes.util
+import errno
+import math
+import socket
+import sys
+import threading
+import time
+from collections import deque
+
+RECONNECT_INTERVAL = 1.0
+"""Seconds OutputEngine waits before trying again to reach a controller it couldn't connect to"""
+
+MAX_BATCH = 1024
+"""Most messages the kernel takes in one sendmmsg call (UIO_MAXIOV)"""
+
+
+class _iovec(ctypes.Structure):
+    # c_char_p so bytes can be assigned straight in, the structure keeps a reference to them
+    _fields_ = [("iov_base", ctypes.c_char_p),
+                ("iov_len", ctypes.c_size_t)]
+
+
+class _msghdr(ctypes.Structure):
+    _fields_ = [("msg_name", ctypes.c_void_p),
+                ("msg_namelen", ctypes.c_uint32),
+                ("msg_iov", ctypes.POINTER(_iovec)),
+                ("msg_iovlen", ctypes.c_size_t),
+                ("msg_control", ctypes.c_void_p),
+                ("msg_controllen", ctypes.c_size_t),
+                ("msg_flags", ctypes.c_int)]
+
+
+class _mmsghdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", _msghdr),
+                ("msg_len", ctypes.c_uint)]
+
+
+class _sockaddr_in(ctypes.Structure):
+    _fields_ = [("sin_family", ctypes.c_ushort),
+                ("sin_port", ctypes.c_uint16),
+                ("sin_addr", ctypes.c_uint8 * 4),
+                ("sin_zero", ctypes.c_uint8 * 8)]
+
+
+def _load_sendmmsg():
+    # None if this platform has no sendmmsg
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        sendmmsg = libc.sendmmsg
+    except (OSError, AttributeError):
+        return None
+    sendmmsg.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int]
+    sendmmsg.restype = ctypes.c_int
+    return sendmmsg
+
+
+class OutputBatch():
+    def __init__(self, use_sendmmsg=True, multicast_interface=None):
+        """multicast_interface is the address of the interface packets to multicast groups go out of, None for the default route"""
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if multicast_interface is not None:
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(multicast_interface))
+        self.queue = []         # (packet, address) waiting for the next flush
+        self.batches = 0        # Flushes that sent anything
+        self.packets = 0        # Packets sent
+        self.errors = 0         # Packets the kernel refused, such as to an unreachable network, the rest still go
+        self.calls = 0          # Send system calls made
+        self.spread = 0.0       # Seconds from the first to the last packet of the last flush reaching the kernel
+        self._sendmmsg = _load_sendmmsg() if use_sendmmsg else None
+        self._addresses = {}    # sockaddr_in for every address sent to, built once
+        # Message headers reused by every flush, grown when a batch needs more
+        self._iovecs = None
+        self._messages = None
+
+    def add(self, packets, address, key=None):
+        """Queue the packets of one device until the next flush, safe to call from several threads
+
+        key is only used by OutputEngine, everything here goes out in the order it was added.
+        """
+        self.queue.extend([(packet, address) for packet in packets])
+
+    def flush(self):
+        """Send everything queued, returns the number of packets sent"""
+        queue, self.queue = self.queue, []
+        if not queue:
+            return 0
+        errors = self.errors
+        if self._sendmmsg is None:
+            start = time.perf_counter()
+            for packet, address in queue:
+                try:
+                    self.sock.sendto(packet, address)
+                except OSError:
+                    self.errors += 1
+            self.spread = time.perf_counter() - start
+            self.calls += len(queue)
+        else:
+            self.spread = 0.0
+            for first in range(0, len(queue), MAX_BATCH):
+                self.spread += self._send_batch(queue[first:first + MAX_BATCH])
+        sent = len(queue) - (self.errors - errors)
+        self.batches += 1
+        self.packets += sent
+        return sent
+
+    def _sockaddr(self, address):
+        sockaddr = self._addresses.get(address)
+        if sockaddr is None:
+            ip, port = address
+            sockaddr = _sockaddr_in(socket.AF_INET, socket.htons(port),
+                                    (ctypes.c_uint8 * 4)(*socket.inet_aton(socket.gethostbyname(ip))))
+            sockaddr = self._addresses[address] = sockaddr
+        return sockaddr
+
+    def _allocate(self, n):
+        self._iovecs = (_iovec * n)()
+        self._messages = (_mmsghdr * n)()
+        for i in range(n):
+            header = self._messages[i].msg_hdr
+            header.msg_namelen = ctypes.sizeof(_sockaddr_in)
+            header.msg_iov = ctypes.pointer(self._iovecs[i])
+            header.msg_iovlen = 1
+
+    def _send_batch(self, queue):
+        if self._messages is None or len(self._messages) < len(queue):
+            self._allocate(max(len(queue), 16))
+        iovecs = self._iovecs
+        messages = self._messages
+        n = 0
+        for packet, address in queue:
+            try:
+                sockaddr = self._sockaddr(address)
+            except OSError:
+                # Host name that doesn't resolve, tried again next flush
+                self.errors += 1
+                continue
+            iovecs[n].iov_base = packet
+            iovecs[n].iov_len = len(packet)
+            messages[n].msg_hdr.msg_name = ctypes.addressof(sockaddr)
+            n += 1
+        # Returns how long the system calls took, the headers above are filled in before anything is sent
+        start = time.perf_counter()
+        sent = 0
+        while sent < n:
+            result = self._sendmmsg(self.sock.fileno(), ctypes.addressof(messages) + sent * ctypes.sizeof(_mmsghdr), n - sent, 0)
+            self.calls += 1
+            if result < 0:
+                if ctypes.get_errno() == errno.EINTR:
+                    continue
+                # sendmmsg stops at the first message that fails, skip it so the devices after it still get theirs
+                self.errors += 1
+                sent += 1
+                continue
+            sent += result
+        return time.perf_counter() - start
+
+
+class _DeviceProtocol(asyncio.DatagramProtocol):
+    """Connection to one controller, owned by the OutputEngine loop"""
+    def __init__(self, engine, address, connect=True):
+        """address is the controller's, or the key of a device whose packets go to several addresses
+
+        Without connect the socket isn't connected, and each packet is sent to its own address.
+        """
+        self.engine = engine
+        self.address = address
+        self.connect = connect
+        self.transport = None
+        self.paused = False     # Transport buffer is over its high-water mark
+        self.pending = None     # (packet, address) of the newest frame not sent yet
+        self.slot = 0.0         # Seconds into the stagger that this device's turn comes
+        self.release = 0.0      # Loop time the pending frame's turn comes
+        self.next_send = 0.0    # Loop time of the earliest turn pacing allows after the last send
+        self.timer = None       # Pending call to send once pacing allows
+        self.connecting = False
+        self.retry_at = 0.0     # Loop time after which a failed connection is tried again
+        self.sent = 0           # Frames sent
+        self.dropped = 0        # Frames replaced by a newer one before they were sent
+        self.errors = 0         # Failed connections and errors reported by the transport
+        self.last_sent = None   # Loop time of the last send
+        self.intervals = 0      # Times between sends measured, and their total and shortest
+        self.interval_total = 0.0
+        self.min_interval = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        if self.engine.multicast_interface is not None:
+            transport.get_extra_info("socket").setsockopt(
+                socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(self.engine.multicast_interface))
+        self.engine._send(self)
+
+    def connection_lost(self, exc):
+        self.transport = None
+
+    def error_received(self, exc):
+        # Usually ICMP port unreachable from a controller that is off, the next frame is sent as normal
+        self.errors += 1
+
+    def pause_writing(self):
+        self.paused = True
+
+    def resume_writing(self):
+        self.paused = False
+        self.engine._send(self)
+
+
+class OutputEngine():
+    def __init__(self, stagger=0.0, multicast_interface=None):
+        """stagger is how many seconds each frame's sends are spread over, devices get evenly spaced turns in it
+
+        multicast_interface is as for OutputBatch.
+        """
+        self.loop = asyncio.new_event_loop()
+        self.stagger = stagger
+        self.multicast_interface = multicast_interface
+        self.queue = []         # (packet, address) waiting for the next flush, render thread only
+        self.frames = 0         # Flushes handed to the loop
+        self.gaps = deque(maxlen=1000)  # Latest seconds between sends to different devices
+        self._last_send = None  # (loop time, address) of the last send to any device
+        self._epoch = self.loop.time()
+        self._devices = {}      # _DeviceProtocol for every address, loop thread only
+        self._intervals = {}    # Least seconds between frames for each address
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self._thread.start()
+
+    def pace(self, address, interval):
+        """Send at most one frame every interval seconds to address, or the key packets were added under, later frames replace held ones"""
+        self._intervals[address] = interval
+
+    def add(self, packets, address, key=None):
+        """Queue the packets of one device until the next flush, safe to call from several threads
+
+        Packets added under the same key, which defaults to the address, are one device: they share its
+        pacing and its turn in the stagger and go out in the order they were added, whatever their address.
+        """
+        self.queue.extend([(packet, address, address if key is None else key) for packet in packets])
+
+    def flush(self):
+        """Hand everything queued to the loop without waiting for it to be sent"""
+        queue, self.queue = self.queue, []
+        if not queue:
+            return 0
+        frames = {}
+        for packet, address, key in queue:
+            frames.setdefault(key, []).append((packet, address))
+        self.frames += 1
+        self.loop.call_soon_threadsafe(self._submit, frames)
+        return len(queue)
+
+    def close(self):
+        """Stop the loop, dropping anything not sent yet"""
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        for device in self._devices.values():
+            if device.transport is not None:
+                device.transport.close()
+        tasks = asyncio.all_tasks(self.loop)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            self.loop.run_until_complete(asyncio.wait(tasks))
+        self.loop.close()
+
+    def stats(self):
+        """Per device counters, read from the render thread so only roughly in step"""
+        return {address: {"sent": device.sent,
+                          "dropped": device.dropped,
+                          "errors": device.errors,
+                          "paused": device.paused,
+                          "interval": device.interval_total / device.intervals if device.intervals else None,
+                          "min_interval": device.min_interval}
+                for address, device in list(self._devices.items())}
+
+    def spacing(self):
+        """Median and shortest of the latest seconds between sends to different devices, None until there have been two"""
+        gaps = sorted(self.gaps)
+        if not gaps:
+            return None, None
+        return gaps[len(gaps) // 2], gaps[0]
+
+    def _submit(self, frames):
+        now = self.loop.time()
+        for key, packets in frames.items():
+            device = self._devices.get(key)
+            if device is None:
+                # A socket connected to the controller hears back if it is unreachable, one sending to several can't be
+                connect = all(address == key for packet, address in packets)
+                device = self._devices[key] = _DeviceProtocol(self, key, connect)
+                for i, other in enumerate(self._devices.values()):
+                    other.slot = self.stagger * i / len(self._devices)
+            if device.pending is None:
+                device.release = self._turn(device, now)
+            if device.transport is None and not device.connecting and self.loop.time() >= device.retry_at:
+                device.connecting = True
+                self.loop.create_task(self._connect(device))
+            if device.pending is not None:
+                device.dropped += 1
+            device.pending = packets
+            self._send(device)
+
+    async def _connect(self, device):
+        try:
+            if device.connect:
+                await self.loop.create_datagram_endpoint(lambda: device, remote_addr=device.address)
+            else:
+                await self.loop.create_datagram_endpoint(lambda: device, family=socket.AF_INET)
+        except OSError:
+            device.errors += 1
+            device.retry_at = self.loop.time() + RECONNECT_INTERVAL
+        finally:
+            device.connecting = False
+
+    def _turn(self, device, now):
+        """Loop time a frame handed over at now may be sent at"""
+        interval = self._intervals.get(device.address, 0.0)
+        if not interval:
+            return now + device.slot
+        # Paced devices send on a grid of their interval shifted by their slot, so devices paced alike keep
+        # their turns however frames arrive, and the grid only moves on once a frame has used a turn
+        start = self._epoch + device.slot
+        return max(device.next_send, start + math.ceil((now - start) / interval) * interval)
+
+    def _send(self, device):
+        if device.pending is None or device.transport is None or device.paused or device.timer is not None:
+            return
+        now = self.loop.time()
+        if now < device.release:
+            # A newer frame arriving in the meantime takes this one's turn, so frames faster than pacing allows coalesce
+            device.timer = self.loop.call_at(device.release, self._paced, device)
+            return
+        for packet, address in device.pending:
+            device.transport.sendto(packet, None if device.connect else address)
+        device.pending = None
+        device.sent += 1
+        device.next_send = device.release + self._intervals.get(device.address, 0.0)
+        self._measure(device, now)
+
+    def _measure(self, device, now):
+        if device.last_sent is not None:
+            interval = now - device.last_sent
+            device.intervals += 1
+            device.interval_total += interval
+            device.min_interval = interval if device.min_interval is None else min(device.min_interval, interval)
+        device.last_sent = now
+        if self._last_send is not None and self._last_send[1] != device.address:
+            self.gaps.append(now - self._last_send[0])
+        self._last_send = (now, device.address)
+
+    def _paced(self, device):
+        device.timer = None
+        self._send(device)
@@ -0,0 +1,241 @@
+"""Packet formats shared by the LED controllers in lib/devices.py and the
+reference receiver in lib/receiver.py (which mirrors ws2812_controller.ino)
+
+A raw frame is the r, g, b bytes of every LED on the strip in one datagram.
+Every other packet starts with a 7 byte header:
+    |magic|type|frame|offset|count|
+where
+    magic  (1 byte): MAGIC
+    type   (1 byte): packet type, with FLAG_LAST set on the last packet of a frame
+    frame  (1 byte): frame id, wrapping at 256
+    offset (2 bytes, little endian): first LED covered by this packet
+    count  (2 bytes, little endian): number of LEDs covered by this packet
+The packets of a frame cover consecutive ranges of LEDs, so a receiver knows
+the frame is complete when the last one arrives and nothing was missed.
+With FLAG_TIMED set in type, the header carries 6 more bytes:
+    |seq|pts|
+where
+    seq (2 bytes, little endian): sequence number of the frame, wrapping at 65536
+    pts (4 bytes, little endian): receiver clock time in microseconds to show it at
+and the receiver drops frames older than one it already has and holds the
+rest until their time, so strips synced to the same pts change together.
+A headed packet is never a multiple of 3 bytes long, so it can't be mistaken
+for a raw frame. Types whose payload could make it one get a zero byte of
+padding on the end when it would.
+"""
+import struct
+import numpy as np
+
+MAGIC = 0xD1
+HEADER = struct.Struct("<BBBHH")
+TIMED = struct.Struct("<HI")
+CLOCK = struct.Struct("<II")
+RUN = struct.Struct("<HB")
+MAX_RUN = 0xFF
+MAX_PALETTE = 0xFF
+
+TYPE_RGB = 0x01
+"""Payload is count * r, g, b bytes"""
+TYPE_DELTA = 0x02
+"""Payload is runs of |start (2 bytes)|length (1 byte)|length * r, g, b| for the LEDs that changed
+
+start is absolute and runs stay inside the packet's offset and count. The run
+header is 3 bytes so the packet still isn't a multiple of 3 bytes long.
+"""
+TYPE_RLE = 0x03
+"""Payload is runs of |length (1 byte)|r|g|b| of identical LEDs, covering count LEDs, plus any padding"""
+TYPE_PALETTE = 0x04
+"""Payload is |n (1 byte)|n * r, g, b|count * index into those colours| plus any padding"""
+TYPE_PING = 0x05
+"""Payload is |t0|0| (4 bytes each), t0 being the sender's clock in microseconds"""
+TYPE_PONG = 0x06
+"""Reply to TYPE_PING, payload is |t0|t1| with t0 copied and t1 the receiver's clock in microseconds"""
+FLAG_LAST = 0x80
+FLAG_TIMED = 0x40
+TYPE_MASK = 0x3F
+
+MAX_PAYLOAD = 1472
+"""Largest UDP payload that fits in one unfragmented 1500 byte MTU datagram"""
+
+
+def rgb_bytes(pixels, max_brightness=255):
+    """Return a (3, n) pixel array as n * 3 bytes of r, g, b"""
+    return pixels.T.clip(0, max_brightness).astype(np.uint8).tobytes()
+
+
+def header(kind, frame, offset, count, last):
+    return HEADER.pack(MAGIC, kind | (FLAG_LAST if last else 0), frame & 0xFF, offset, count)
+
+
+def pad(packet):
+    """Add a zero byte to a headed packet if it would otherwise be a multiple of 3 bytes long"""
+    return packet + b"\0" if len(packet) % 3 == 0 else packet
+
+
+def stamp(packets, seq, pts):
+    """Return packets with FLAG_TIMED set and the |seq|pts| extension inserted after their header"""
+    extension = TIMED.pack(seq & 0xFFFF, pts & 0xFFFFFFFF)
+    return [packet[:1] + bytes([packet[1] | FLAG_TIMED]) + packet[2:HEADER.size] + extension + packet[HEADER.size:]
+            for packet in packets]
+
+
+def clock_packet(kind, t0, t1=0):
+    """TYPE_PING or TYPE_PONG packet carrying the given clock readings"""
+    return pad(header(kind, 0, 0, 0, True) + CLOCK.pack(t0 & 0xFFFFFFFF, t1 & 0xFFFFFFFF))
+
+
+def chunk_frame(rgb, frame, max_payload=MAX_PAYLOAD):
+    """Split the r, g, b bytes of a frame into TYPE_RGB packets of at most max_payload bytes"""
+    per_packet = (max_payload - HEADER.size) // 3
+    n = len(rgb) // 3
+    packets = []
+    for offset in range(0, n, per_packet):
+        count = min(per_packet, n - offset)
+        packets.append(header(TYPE_RGB, frame, offset, count, offset + count == n) + rgb[offset * 3:(offset + count) * 3])
+    return packets
+
+
+def changed_runs(current, previous, gap=1):
+    """Return the starts and stops of runs of LEDs that differ between two (n, 3) arrays
+
+    Runs separated by no more than gap unchanged LEDs are merged, since
+    resending those is cheaper than another run header
+    """
+    changed = np.any(current != previous, axis=1).astype(np.int8)
+    edges = np.diff(np.concatenate(([0], changed, [0])))
+    starts = np.flatnonzero(edges == 1)
+    stops = np.flatnonzero(edges == -1)
+    if len(starts) > 1:
+        keep = starts[1:] - stops[:-1] > gap
+        starts = starts[np.concatenate(([True], keep))]
+        stops = stops[np.concatenate((keep, [True]))]
+    return starts, stops
+
+
+def delta_size(starts, stops):
+    """Payload bytes needed to send the runs from changed_runs, not counting runs split between packets"""
+    lengths = stops - starts
+    return int(np.sum(-(-lengths // MAX_RUN))) * RUN.size + 3 * int(np.sum(lengths))
+
+
+def delta_frame(leds, starts, stops, frame, max_payload=MAX_PAYLOAD):
+    """Pack runs of LEDs from an (n, 3) uint8 array into TYPE_DELTA packets of at most max_payload bytes
+
+    Runs longer than MAX_RUN or that don't fit in what is left of a packet
+    are split, and each
+    packet covers the LEDs from the end of the previous one
+    """
+    limit = max_payload - HEADER.size
+    packets = []
+    payload = []
+    size = 0
+    begin = 0
+    for start, stop in zip(starts.tolist(), stops.tolist()):
+        while start < stop:
+            room = (limit - size - RUN.size) // 3
+            if room <= 0:
+                packets.append(header(TYPE_DELTA, frame, begin, start - begin, False) + b"".join(payload))
+                payload = []
+                size = 0
+                begin = start
+                continue
+            end = min(stop, start + room, start + MAX_RUN)
+            payload.append(RUN.pack(start, end - start))
+            payload.append(leds[start:end].tobytes())
+            size += RUN.size + 3 * (end - start)
+            start = end
+    packets.append(header(TYPE_DELTA, frame, begin, len(leds) - begin, True) + b"".join(payload))
+    return packets
+
+
+def identical_runs(leds):
+    """Return the first LED of every run of identical LEDs in an (n, 3) array
+
+    Runs longer than MAX_RUN are split so their length fits in a byte.
+    """
+    new = np.empty(len(leds), dtype=bool)
+    new[0] = True
+    np.any(leds[1:] != leds[:-1], axis=1, out=new[1:])
+    starts = np.flatnonzero(new)
+    pieces = (np.diff(np.append(starts, len(leds))) - 1) // MAX_RUN + 1
+    if pieces.max() > 1:
+        within = np.arange(pieces.sum()) - np.repeat(np.cumsum(pieces) - pieces, pieces)
+        starts = np.repeat(starts, pieces) + within * MAX_RUN
+    return starts
+
+
+def rle_frame(leds, starts, frame, max_payload=MAX_PAYLOAD):
+    """Pack an (n, 3) uint8 array into TYPE_RLE packets, starts being identical_runs(leds)"""
+    runs = np.empty((len(starts), 4), dtype=np.uint8)
+    runs[:, 0] = np.diff(np.append(starts, len(leds)))
+    runs[:, 1:] = leds[starts]
+    # One byte is kept free for padding
+    per_packet = (max_payload - HEADER.size - 1) // 4
+    packets = []
+    for first in range(0, len(starts), per_packet):
+        offset = int(starts[first])
+        end = int(starts[first + per_packet]) if first + per_packet < len(starts) else len(leds)
+        packets.append(pad(header(TYPE_RLE, frame, offset, end - offset, end == len(leds)) + runs[first:first + per_packet].tobytes()))
+    return packets
+
+
+def palette(leds):
+    """Return the distinct colours of an (n, 3) uint8 array as an (m, 3) array and the index of every LED's colour"""
+    keys = (leds[:, 0].astype(np.uint32) << 16) | (leds[:, 1].astype(np.uint32) << 8) | leds[:, 2]
+    keys, indices = np.unique(keys, return_inverse=True)
+    colours = np.empty((len(keys), 3), dtype=np.uint8)
+    colours[:, 0] = keys >> 16
+    colours[:, 1] = keys >> 8
+    colours[:, 2] = keys
+    if len(keys) <= MAX_PALETTE:
+        indices = indices.astype(np.uint8)
+    return colours, indices
+
+
+def palette_per_packet(colours, max_payload=MAX_PAYLOAD):
+    """LEDs that fit in one TYPE_PALETTE packet after the palette and a byte for padding"""
+    return max_payload - HEADER.size - 1 - 3 * len(colours) - 1
+
+
+def palette_frame(colours, indices, frame, max_payload=MAX_PAYLOAD):
+    """Pack the output of palette into TYPE_PALETTE packets, every packet repeating the palette"""
+    table = bytes([len(colours)]) + colours.tobytes()
+    per_packet = palette_per_packet(colours, max_payload)
+    n = len(indices)
+    packets = []
+    for offset in range(0, n, per_packet):
+        count = min(per_packet, n - offset)
+        packets.append(pad(header(TYPE_PALETTE, frame, offset, count, offset + count == n) + table + indices[offset:offset + count].tobytes()))
+    return packets
+
+
+def compression(leds, max_payload=MAX_PAYLOAD):
+    """Pick whichever of TYPE_RGB, TYPE_RLE or TYPE_PALETTE encodes an (n, 3) uint8 array smallest
+
+    Only the payload size of each encoding is worked out, no packets are built.
+
+    Returns
+    -------
+    size : int
+        Payload bytes of the smallest encoding
+    encode : function
+        Takes a frame id and returns the packets of that encoding
+    """
+    n = len(leds)
+    starts = identical_runs(leds)
+    rle_size = 4 * len(starts)
+    colours, indices = palette(leds)
+    palette_size = None
+    if len(colours) <= MAX_PALETTE:
+        per_packet = palette_per_packet(colours, max_payload)
+        palette_size = -(-n // per_packet) * (1 + 3 * len(colours)) + n
+    if palette_size is not None and palette_size < min(rle_size, 3 * n):
+        return palette_size, lambda frame: palette_frame(colours, indices, frame, max_payload)
+    if rle_size < 3 * n:
+        return rle_size, lambda frame: rle_frame(leds, starts, frame, max_payload)
+    return 3 * n, lambda frame: chunk_frame(leds.tobytes(), frame, max_payload)
+
+
+def compress_frame(leds, frame, max_payload=MAX_PAYLOAD):
+    """Encode an (n, 3) uint8 array as whichever packets compression picks"""
+    return compression(leds, max_payload)[1](frame)
@@ -0,0 +1,221 @@
+"""Python reference receiver for the packets sent by lib/devices.py
+
+Decodes packets the same way ws2812_controller.ino does, so the output path can
+be checked without any hardware. Run it on the port a device is configured for:
+    python -m lib.receiver 300 7778
+"""
+import socket
+import sys
+import time
+from collections import deque
+import numpy as np
+import lib.packets as packets
+import lib.sink as sink
+from lib.clock import now_us, wrapped
+
+
+class Receiver():
+    MAX_PENDING = 4
+    """Timed frames held at once, like the buffers ws2812_controller.ino has for them"""
+
+    MAX_STALE = 8
+    """Timed frames dropped in a row as old after which the sender is taken to have restarted its numbering"""
+
+    def __init__(self, n_pixels, clock=now_us):
+        """clock returns the receiver's time in microseconds, wrapping at 32 bits"""
+        self.n_pixels = n_pixels
+        self.clock = clock
+        # Frame being assembled from packets, one (r, g, b) row per LED
+        self.leds = np.zeros((n_pixels, 3), dtype=np.uint8)
+        # What the strip is currently showing
+        self.shown = self.leds
+        self.frames = 0         # Frames shown
+        self.invalid = 0        # Packets with a bad size or header
+        self.incomplete = 0     # Frames abandoned because a packet was missing
+        self.stale = 0          # Timed packets dropped for being older than a frame already complete
+        self.late = 0           # Timed frames completed after their presentation time, shown straight away
+        self.replaced = 0       # Timed frames passed over for a newer one that was also due
+        self._frame = None      # Id of the frame being assembled
+        self._received = 0      # LEDs of that frame received so far
+        self._seq = None        # Sequence number of the last complete timed frame
+        self._stale_frames = 0  # Timed frames dropped in a row for being older than it
+        # (pts, leds) of complete timed frames waiting for their time, oldest first
+        self._pending = deque(maxlen=self.MAX_PENDING)
+
+    def reply(self, packet):
+        """Return the TYPE_PONG answering a TYPE_PING, or None if the packet isn't one"""
+        if len(packet) >= packets.HEADER.size + packets.CLOCK.size and packet[0] == packets.MAGIC \
+                and packet[1] & packets.TYPE_MASK == packets.TYPE_PING:
+            t0, _ = packets.CLOCK.unpack_from(packet, packets.HEADER.size)
+            return packets.clock_packet(packets.TYPE_PONG, t0, self.clock())
+        return None
+
+    def poll(self, now=None):
+        """Show the newest timed frame whose time has come, returns True if there was one"""
+        if now is None:
+            now = self.clock()
+        due = None
+        while self._pending and wrapped(now - self._pending[0][0]) >= 0:
+            if due is not None:
+                self.replaced += 1
+            due = self._pending.popleft()
+        if due is None:
+            return False
+        self.shown = due[1]
+        return self.show()
+
+    def until_due(self, now=None):
+        """Seconds until the next timed frame is due, None if none are waiting"""
+        if not self._pending:
+            return None
+        return max(0, wrapped(self._pending[0][0] - (self.clock() if now is None else now))) / 1e6
+
+    def receive(self, packet, now=None):
+        """Handle one datagram, returns True if it completed a frame that was shown straight away"""
+        if now is None:
+            now = self.clock()
+        self.poll(now)
+        if len(packet) == self.n_pixels * 3:
+            self.leds[:] = np.frombuffer(packet, dtype=np.uint8).reshape(-1, 3)
+            self._frame = None
+            self.shown = self.leds
+            return self.show()
+        # Headed packets longer than MAX_PACKET don't fit the firmware's buffer, it drops them
+        if len(packet) < packets.HEADER.size or len(packet) > packets.MAX_PAYLOAD or packet[0] != packets.MAGIC:
+            self.invalid += 1
+            return False
+        magic, kind, frame, offset, count = packets.HEADER.unpack_from(packet)
+        start = packets.HEADER.size
+        timed = kind & packets.FLAG_TIMED
+        if timed:
+            if len(packet) < start + packets.TIMED.size:
+                self.invalid += 1
+                return False
+            seq, pts = packets.TIMED.unpack_from(packet, start)
+            start += packets.TIMED.size
+            if self._seq is not None and (seq == self._seq or (seq - self._seq) & 0xFFFF >= 0x8000):
+                self.stale += 1
+                if kind & packets.FLAG_LAST:
+                    self._stale_frames += 1
+                    if self._stale_frames >= self.MAX_STALE:
+                        self._seq = None
+                        self._stale_frames = 0
+                return False
+        payload = memoryview(packet)[start:]
+        if offset + count > self.n_pixels or not self.decode(kind & packets.TYPE_MASK, offset, count, payload):
+            self.invalid += 1
+            return False
+        if frame != self._frame:
+            if self._received:
+                self.incomplete += 1
+            self._frame = frame
+            self._received = 0
+        self._received += count
+        if kind & packets.FLAG_LAST:
+            complete = self._received == offset + count
+            self._frame = None
+            self._received = 0
+            if not complete:
+                self.incomplete += 1
+            elif not timed:
+                self.shown = self.leds
+                return self.show()
+            else:
+                self._seq = seq
+                self._stale_frames = 0
+                if wrapped(now - pts) >= 0:
+                    # Due already, like queue_frame in the firmware, and anything still waiting is older so never shown
+                    self.late += 1
+                    self.replaced += len(self._pending)
+                    self._pending.clear()
+                    self.shown = self.leds.copy()
+                    return self.show()
+                if len(self._pending) == self._pending.maxlen:
+                    self.replaced += 1
+                self._pending.append((pts, self.leds.copy()))
+        return False
+
+    def decode(self, kind, offset, count, payload):
+        """Apply the payload of a headed packet to leds, returns False if it is malformed"""
+        if kind == packets.TYPE_RGB:
+            if len(payload) != count * 3:
+                return False
+            self.leds[offset:offset + count] = np.frombuffer(payload, dtype=np.uint8).reshape(-1, 3)
+            return True
+        if kind == packets.TYPE_DELTA:
+            position = 0
+            while position < len(payload):
+                if position + packets.RUN.size > len(payload):
+                    return False
+                start, length = packets.RUN.unpack_from(payload, position)
+                position += packets.RUN.size
+                if start < offset or start + length > offset + count or position + length * 3 > len(payload):
+                    return False
+                self.leds[start:start + length] = np.frombuffer(payload[position:position + length * 3], dtype=np.uint8).reshape(-1, 3)
+                position += length * 3
+            return True
+        if kind == packets.TYPE_RLE:
+            size = len(payload) - len(payload) % 4
+            if len(payload) - size > 1:
+                return False
+            runs = np.frombuffer(payload[:size], dtype=np.uint8).reshape(-1, 4)
+            lengths = runs[:, 0].astype(int)
+            if lengths.sum() != count:
+                return False
+            self.leds[offset:offset + count] = np.repeat(runs[:, 1:], lengths, axis=0)
+            return True
+        if kind == packets.TYPE_PALETTE:
+            if len(payload) < 1:
+                return False
+            n = payload[0]
+            if len(payload) - (1 + 3 * n) not in (count, count + 1):
+                return False
+            colours = np.frombuffer(payload[1:1 + 3 * n], dtype=np.uint8).reshape(-1, 3)
+            indices = np.frombuffer(payload[1 + 3 * n:1 + 3 * n + count], dtype=np.uint8)
+            if count and indices.max() >= n:
+                return False
+            self.leds[offset:offset + count] = colours[indices]
+            return True
+        return False
+
+    def show(self):
+        self.frames += 1
+        return True
+
+    def pixels(self):
+        """Return what the strip is showing as a (3, n_pixels) array, like LEDController.show takes"""
+        return self.shown.T
+
+
+class Sink(sink.Sink):
+    """Stand-in ESP8266 that decodes what it is sent with a Receiver and answers its clock pings"""
+    def __init__(self, n_pixels, port=0, host="127.0.0.1"):
+        super().__init__(port, host)
+        self.receiver = Receiver(n_pixels)
+
+    def serve(self):
+        receiver = self.receiver
+        while True:
+            # Wake up for the pending timed frame even if nothing arrives
+            self.sock.settimeout(receiver.until_due())
+            try:
+                packet, address = self.sock.recvfrom(65536)
+            except socket.timeout:
+                shown = receiver.poll()
+            else:
+                reply = receiver.reply(packet)
+                if reply is not None:
+                    self.sock.sendto(reply, address)
+                    continue
+                shown = receiver.receive(packet) or receiver.poll()
+            if shown:
+                self.frame_times.append(time.monotonic())
+
+    def report(self):
+        receiver = self.receiver
+        return "{} frames, {} invalid packets, {} incomplete frames, {} stale packets, {} late frames, {}".format(
+            receiver.frames, receiver.invalid, receiver.incomplete, receiver.stale, receiver.late, self.intervals())
+
+
+if __name__ == "__main__":
+    sink.run(Sink(int(sys.argv[1]), int(sys.argv[2]), "0.0.0.0"))
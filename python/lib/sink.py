@@ -0,0 +1,50 @@
+"""Shared parts of the stand-in controllers in lib/dmx.py, lib/ddp.py, lib/opc.py and lib/receiver.py
+
+A stand-in binds a socket like the controller would, serves it on a thread of
+its own and counts what arrives, so the output path can be checked and timed
+without any hardware. Each module's __main__ runs its stand-in with run().
+"""
+import socket
+import threading
+import time
+import numpy as np
+
+
+class Sink():
+    """Socket of a stand-in controller, subclasses read it in serve() and describe what arrived in report()"""
+    def __init__(self, port=0, host="127.0.0.1", kind=socket.SOCK_DGRAM):
+        self.sock = socket.socket(socket.AF_INET, kind)
+        if kind == socket.SOCK_DGRAM:
+            # Room for a burst of frames while the thread is behind
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 22)
+        else:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        if kind == socket.SOCK_STREAM:
+            self.sock.listen()
+        self.port = self.sock.getsockname()[1]
+        self.frame_times = []   # Arrival time of every frame
+
+    def start(self):
+        threading.Thread(target=self.serve, daemon=True).start()
+        return self
+
+    def serve(self):
+        raise NotImplementedError
+
+    def report(self):
+        raise NotImplementedError
+
+    def intervals(self):
+        """Mean, standard deviation and longest time between frames, for report()"""
+        intervals = np.diff(self.frame_times) * 1000 if len(self.frame_times) > 1 else np.zeros(1)
+        return "frame interval {:.2f} ms mean {:.2f} ms std {:.2f} ms max".format(
+            intervals.mean(), intervals.std(), intervals.max())
+
+
+def run(sink, interval=5.0):
+    """Serve a stand-in forever, printing its report every interval seconds"""
+    sink.start()
+    while True:
+        time.sleep(interval)
+        print(sink.report())
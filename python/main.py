@@ -10,17 +10,20 @@ import lib.microphone as microphone
 from lib.dsp import ExpFilter
 #import lib.led as led
 import lib.devices as devices
+import lib.opc as opc
+from lib.output import OutputBatch, OutputEngine
 import lib.bottle as bottle
 import logging
 import subprocess
 from threading import Thread
+from concurrent.futures import ThreadPoolExecutor
 import datetime
 import lib.api as api
 import random
 import socket
 import util
 from visualizer import Visualizer
-from lib.dsp import DSP
+from lib.dsp import DSP, AudioAnalyser
 from lib.viot import viot
 
 class Board():
@@ -31,11 +34,16 @@ class Board():
         self.visualizer = Visualizer(self)
         self.signalProcessor = DSP(self)
     
-        self.esp = devices.ESP8266(
-            ip            = self.config["UDP_IP"],
-            port          = self.config["UDP_PORT"],
-            leds          = self.config["N_PIXELS"]
-        )
+        self.esp = devices.create(self.config, output)
+        if isinstance(output, OutputEngine) and self.config["MAX_FPS"]:
+            if self.config["TYPE"] == "ESP8266":
+                output.pace((self.config["UDP_IP"], self.config["UDP_PORT"]), 1.0 / self.config["MAX_FPS"])
+            elif self.config["TYPE"] in ("E131", "ArtNet"):
+                output.pace(self.esp.key, 1.0 / self.config["MAX_FPS"])
+        # Frame pacing, effects that want fewer frames than the audio rate reuse their last output until this time
+        self.nextFrame = 0.0
+        self.lastOutput = None
+
     def getProfile(self):
         return {
             "currentEffect": self.config["current_effect"],
@@ -49,6 +57,18 @@ class Board():
 
         print("PROFILE SET CUR EFFECT", self.config)
 
+    def updateColour(self):
+        """Bring the device's colour lookup table up to date, it is only rebuilt if something changed"""
+        calibration = self.effectConfig["Calibration"]
+        if self.config["current_effect"] == "Calibration":
+            # Calibration shows the raw values the white balance is found with
+            white_balance = (1, 1, 1)
+        else:
+            white_balance = (calibration["r"], calibration["g"], calibration["b"])
+        gamma = config.settings["configuration"]["GAMMA"] if self.config["SOFTWARE_GAMMA_CORRECTION"] else None
+        self.esp.lut.update(config.settings["brightness"], white_balance,
+                            config.settings["configuration"]["maxBrightness"], gamma)
+
 
 def frames_per_second():
     """ Return the estimated frames per second
@@ -92,48 +112,118 @@ def microphone_update(audio_samples):
         if(boards[syncBoard].config["N_PIXELS"] < boards[board].config["N_PIXELS"]):
             syncBoard = board
     
-    # Get processed audio data for each device
+    # Run the FFT once for this frame, then get processed audio data for each device
+    spectrum = audioAnalyser.update(audio_samples)
     audio_datas = {}
     for board in boards:
-        audio_datas[board] = boards[board].signalProcessor.update(audio_samples)
+        audio_datas[board] = boards[board].signalProcessor.update(spectrum)
         
     outputs = {}
 
     def renderBoard(board):
+        """Render a new frame for the board if its effect is due one, otherwise reuse the last"""
+        now = time.time()
+        if now < boards[board].nextFrame and boards[board].lastOutput is not None:
+            outputs[board] = boards[board].lastOutput
+            return
+        boards[board].nextFrame = now + boards[board].visualizer.frame_interval()
+
         audio_input = audio_datas[board]["vol"] > config.settings["configuration"]["MIN_VOLUME_THRESHOLD"]
+        # Brightness is applied by each device's colour lookup table
         outputs[board] = boards[board].visualizer.get_vis(audio_datas[board]["mel"], audio_input)
+        boards[board].lastOutput = outputs[board]
 
-
-        if(boards[board].config["current_effect"] in boards[board].effectConfig and "delay" in boards[board].effectConfig[boards[board].config["current_effect"]]):
-            time.sleep(boards[board].effectConfig[boards[board].config["current_effect"]]["delay"])
-
-        outputs[board][0] = outputs[board][0] * config.settings["brightness"]
-        outputs[board][1] = outputs[board][1] * config.settings["brightness"]
-        outputs[board][2] = outputs[board][2] * config.settings["brightness"]
-
+    # Reused frames are still shown, the devices skip sending them until their refresh interval runs out
     if(config.settings["sync"]):
         renderBoard(syncBoard)
+        # Boards with timed frames all show this one at the same moment
+        present = time.monotonic() + config.settings["configuration"]["SYNC_LATENCY"]
         for board in boards:
-            boards[board].esp.show(outputs[syncBoard])
-    else:
+            boards[board].updateColour()
+        shown = set()
+        for members, group in multicastGroups.items():
+            if group.show(outputs[syncBoard], present):
+                shown.update(members)
+        # Boards in no group, or whose group couldn't be sent one frame for all of them
         for board in boards:
+            if board not in shown:
+                boards[board].esp.show(outputs[syncBoard], present)
+    else:
+        def renderAndShow(board):
             renderBoard(board)
+            boards[board].updateColour()
             boards[board].esp.show(outputs[board])
 
+        if renderPool is None:
+            for board in boards:
+                renderAndShow(board)
+        else:
+            # NumPy and sendto release the GIL, so boards render and send side by side. Every board has to
+            # finish before the next audio frame reuses the shared spectrum, so this is a barrier.
+            for future in [renderPool.submit(renderAndShow, board) for board in boards]:
+                future.result()
+        # The members were sent their own frames, so the group's last frame is no longer what they show
+        for group in multicastGroups.values():
+            group.forget()
+
+    if output is not None:
+        output.flush()
+    # Fadecandy boards that skipped the frame queued nothing, the others' messages still go out now
+    opc.flush()
+
     # FPS update
     fps = frames_per_second()
     if time.time() - 0.5 > prev_fps_update:
         prev_fps_update = time.time()
 
-    # if config.settings["configuration"]["displayFPS"]:
-    #print('FPS {:.0f} / {:.0f}'.format(fps, config.settings["configuration"]["FPS"]))
-
-
+        if config.settings["configuration"]["displayFPS"]:
+            stats = microphone.frames.stats()
+            controllers = [boards[board].esp for board in boards] + [group.esp for group in multicastGroups.values()]
+            skipped = sum(controller.skipped for controller in controllers)
+            sent = sum(controller.sent for controller in controllers)
+            print('FPS {:.0f} / {:.0f}  dropped {} late {}  frames sent {} skipped {}'.format(
+                fps, config.settings["configuration"]["FPS"], stats["dropped"], stats["late"], sent, skipped))
+            if isinstance(output, OutputEngine):
+                mean, shortest = output.spacing()
+                if mean is not None:
+                    coalesced = sum(device["dropped"] for device in output.stats().values())
+                    print('Sends {:.1f} ms apart (median), at least {:.1f} ms, frames coalesced {}'.format(mean * 1000, shortest * 1000, coalesced))
+
+
+
+audioAnalyser = AudioAnalyser()
+# Shared by every board, so a frame's packets all go out together after rendering
+multicastInterface = config.settings["configuration"]["MULTICAST_INTERFACE"]
+if config.settings["configuration"]["OUTPUT"] == "batch":
+    output = OutputBatch(multicast_interface=multicastInterface)
+elif config.settings["configuration"]["OUTPUT"] == "async":
+    output = OutputEngine(multicast_interface=multicastInterface)
+elif config.settings["configuration"]["OUTPUT"] == "staggered":
+    output = OutputEngine(stagger=1.0 / config.settings["configuration"]["FPS"], multicast_interface=multicastInterface)
+elif config.settings["configuration"]["OUTPUT"] == "direct":
+    output = None
+else:
+    raise ValueError("Invalid OUTPUT {}".format(config.settings["configuration"]["OUTPUT"]))
 
 boards = {}
 for board in config.settings["devices"]:
     boards[board] = Board(board)
 
+# Boards sharing a multicast group, synced frames go to each group in one datagram instead of once per board
+multicastBoards = {}
+for board in boards:
+    if boards[board].config["MULTICAST"]:
+        multicastBoards.setdefault(boards[board].config["MULTICAST"], []).append(board)
+multicastGroups = {tuple(members): devices.MulticastGroup(group,
+                                                          [boards[b].config for b in members],
+                                                          [boards[b].esp for b in members],
+                                                          output, multicastInterface)
+                   for group, members in multicastBoards.items()}
+if isinstance(output, OutputEngine):
+    for members, group in multicastGroups.items():
+        if boards[members[0]].config["MAX_FPS"]:
+            output.pace(group.address, 1.0 / boards[members[0]].config["MAX_FPS"])
+
 prev_fps_update = time.time()
 # The previous time that the frames_per_second() function was called
 _time_prev = time.time() * 1000.0
@@ -143,6 +233,45 @@ _fps = ExpFilter(val=config.settings["configuration"]["FPS"], alpha_decay=0.2, a
 
 
 
+# Worker pool for rendering and sending boards in parallel when they aren't synced
+renderPool = None
+if config.settings["configuration"]["RENDER_WORKERS"] > 1:
+    renderPool = ThreadPoolExecutor(max_workers=config.settings["configuration"]["RENDER_WORKERS"])
+
+def benchmark_render(frames=300):
+    """Time unsynced frames with boards rendered one after another and on the worker pool
+
+    Uses random audio, so effects render as if music were playing. Frames go
+to Stripless stand-ins, so nothing is sent to the boards. Run with
+        python main.py --benchmark-render
+    """
+    global renderPool
+    pool = renderPool or ThreadPoolExecutor(max_workers=len(boards))
+    sync = config.settings["sync"]
+    config.settings["sync"] = False
+    controllers = {board: boards[board].esp for board in boards}
+    for board in boards:
+        boards[board].esp = devices.Stripless()
+    samples = int(config.settings["configuration"]["MIC_RATE"] / config.settings["configuration"]["FPS"])
+    timings = {}
+    for mode, renderPool in (("serial", None), ("pool", pool)):
+        start = time.time()
+        for i in range(frames):
+            microphone_update((np.random.randn(samples) * 3000).astype(np.float32))
+        timings[mode] = (time.time() - start) / frames
+    if config.settings["configuration"]["RENDER_WORKERS"] <= 1:
+        renderPool = None
+        pool.shutdown()
+    else:
+        renderPool = pool
+    config.settings["sync"] = sync
+    for board in boards:
+        boards[board].esp = controllers[board]
+    print('{} boards, {} frames'.format(len(boards), frames))
+    print('Serial: {:.2f} ms/frame, pool: {:.2f} ms/frame, speedup {:.2f}x'.format(
+        timings["serial"] * 1000, timings["pool"] * 1000, timings["serial"] / timings["pool"]))
+
+
 apiThread = None
 
 api.setBoards(boards)
@@ -153,5 +282,8 @@ def doStream():
 
 
 if __name__ == "__main__":
-    streamThread = Thread(target=doStream)
-    streamThread.start()
+    if "--benchmark-render" in sys.argv:
+        benchmark_render()
+    else:
+        streamThread = Thread(target=doStream)
+        streamThread.start()
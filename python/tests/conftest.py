@@ -0,0 +1,14 @@
+import os
+import sys
+
+# The modules import each other as lib.x, so python/ has to be on the path whichever directory pytest is started from
+PYTHON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PYTHON_DIR)
+
+# config reads config.json from the working directory when it is first imported
+_cwd = os.getcwd()
+os.chdir(PYTHON_DIR)
+try:
+    import config
+finally:
+    os.chdir(_cwd)
@@ -0,0 +1,87 @@
+import time
+import numpy as np
+import lib.devices as devices
+import lib.dmx as dmx
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+def board_config(kind, port, **settings):
+    config = {"TYPE": kind, "UDP_IP": "127.0.0.1", "UDP_PORT": port, "N_PIXELS": 500, "UNIVERSE": 1,
+              "SYNC_UNIVERSE": 0, "SKIP_THRESHOLD": 0, "REFRESH_INTERVAL": 1.0}
+    config.update(settings)
+    return config
+
+
+def leds(n, seed):
+    return np.random.default_rng(seed).integers(0, 256, (n, 3), dtype=np.uint8)
+
+
+def test_e131_splits_the_strip_into_universes_and_syncs():
+    sink = dmx.Sink().start()
+    board = devices.create(board_config("E131", sink.port, UNIVERSE=3, SYNC_UNIVERSE=9))
+    frames = [leds(500, seed) for seed in range(5)]
+    for frame in frames:
+        board.show(frame.T.astype(float))
+    assert wait_for(lambda: sink.syncs == 5 and sum(sink.universes.values()) == 15)
+    # 170 LEDs to a universe, the last one takes what is left
+    assert sink.universes == {3: 5, 4: 5, 5: 5}
+    assert [len(sink.data[u]) for u in (3, 4, 5)] == [510, 510, 480]
+    assert b"".join(sink.data[u] for u in (3, 4, 5)) == frames[-1].tobytes()
+    assert sink.bad == 0
+
+
+def test_artnet_pads_odd_universes_and_syncs():
+    sink = dmx.Sink().start()
+    board = devices.create(board_config("ArtNet", sink.port, N_PIXELS=341, UNIVERSE=0, SYNC_UNIVERSE=1))
+    frame = leds(341, 1)
+    board.show(frame.T.astype(float))
+    assert wait_for(lambda: sink.syncs == 1 and sum(sink.universes.values()) == 3)
+    # ArtDmx data has an even number of channels, so the single LED of the last universe gets a padding byte
+    assert [len(sink.data[u]) for u in (0, 1, 2)] == [510, 510, 4]
+    assert b"".join(sink.data[u] for u in (0, 1, 2))[:3 * 341] == frame.tobytes()
+
+
+def test_without_sync_frames_are_timed_by_the_first_universe():
+    sink = dmx.Sink().start()
+    board = devices.create(board_config("E131", sink.port))
+    for seed in range(4):
+        board.show(leds(500, seed).T.astype(float))
+    assert wait_for(lambda: len(sink.frame_times) == 4)
+    assert sink.syncs == 0
+    # Repeated frames are skipped by the device
+    board.show(leds(500, 3).T.astype(float))
+    time.sleep(0.05)
+    assert sum(sink.universes.values()) == 12
+
+
+def test_universes_and_sync_are_queued_in_order_under_one_key():
+    class RecordingOutput():
+        def __init__(self):
+            self.queue = []
+
+        def add(self, packets, address, key=None):
+            self.queue.extend((packet, address, key) for packet in packets)
+
+    output = RecordingOutput()
+    board = devices.DMX(None, 500, 1, "e131", 9, output=output)
+    board.show(leds(500, 2).T.astype(float))
+    assert [address for packet, address, key in output.queue] == \
+        [(dmx.multicast_address(u), dmx.E131_PORT) for u in (1, 2, 3, 9)]
+    assert len({key for packet, address, key in output.queue}) == 1
+    # The sync packet is the short one, last
+    assert len(output.queue[-1][0]) == dmx.E131_SYNC
+
+
+def test_sequence_numbers_skip_zero_for_artnet():
+    frame = dmx.Frame(10, protocol="artnet")
+    sequences = [frame.encode(bytes(30))[0][12] for i in range(600)]
+    assert 0 not in sequences
+    assert sequences[:3] == [1, 2, 3]
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from lib.lut import LUT
+
+
+def pixels(seed=0):
+    """Pixels as effects leave them, some well past 255"""
+    rng = np.random.default_rng(seed)
+    p = rng.uniform(0, 255, (3, 2000))
+    p[:, :500] *= 30
+    p[:, :5] = [7528, 554, 255, 300, 0]
+    return p
+
+
+@pytest.mark.parametrize("brightness", [1.0, 0.75, 0.3, 0.05, 1.5, 0.0])
+def test_default_curve_matches_clipping_after_brightness(brightness):
+    lut = LUT()
+    lut.update(brightness=brightness)
+    p = pixels()
+    expected = np.clip(p * brightness, 0, 255).astype(np.uint8).T
+    assert np.array_equal(lut.apply(p), expected)
+
+
+@pytest.mark.parametrize("brightness, white_balance, max_brightness, gamma", [
+    (1.0, (255, 200, 150), 255, None),
+    (0.5, (1, 1, 1), 180, None),
+    (0.8, (255, 200, 150), 220, 2.2),
+    (0.2, (100, 255, 255), 255, 2.8),
+])
+def test_device_curves_match_the_float_pipeline(brightness, white_balance, max_brightness, gamma):
+    lut = LUT()
+    lut.update(brightness, white_balance, max_brightness, gamma)
+    p = pixels(1)
+    values = np.clip(p * brightness, 0, 255)
+    if gamma is not None:
+        values = 255 * (values / 255) ** gamma
+    white = np.array(white_balance, dtype=float).reshape(3, 1)
+    expected = np.minimum(values * white / white.max(), max_brightness).astype(np.uint8).T
+    difference = np.abs(lut.apply(p).astype(int) - expected)
+    if gamma is None and len(set(white_balance)) == 1:
+        assert difference.max() == 0
+    else:
+        # The table has 16 steps for every step of 1 before gamma and white balance, so it may be a step off
+        assert difference.max() <= 1
+
+
+def test_table_is_only_rebuilt_when_settings_change():
+    lut = LUT()
+    builds = lut.builds
+    assert lut.update(0.5, (255, 255, 255), 255, 2.2)
+    assert not lut.update(0.5, (1, 1, 1), 255, 2.2)
+    assert lut.builds == builds + 1
+
+
+def test_negative_pixels_are_black():
+    lut = LUT()
+    assert not lut.apply(np.full((3, 4), -20.0)).any()
+
+
+def test_clip_below_255_comes_before_gamma():
+    lut = LUT(clip=250)
+    p = pixels(2)
+    lut.update(brightness=0.9)
+    assert np.array_equal(lut.apply(p), np.clip(p * 0.9, 0, 250).astype(np.uint8).T)
+    lut.update(brightness=0.9, gamma=2.2)
+    assert lut.apply(p).max() == int(255 * (250 / 255) ** 2.2)
@@ -0,0 +1,66 @@
+import numpy as np
+import lib.devices as devices
+
+
+class RecordingOutput():
+    """Output stage that keeps every frame's packets and where they went"""
+    def __init__(self):
+        self.sent = []
+
+    def add(self, packets, address):
+        if packets:
+            self.sent.append((address, [bytes(packet) for packet in packets]))
+
+
+def board_config(ip):
+    return {"TYPE": "ESP8266", "TIMED": False, "UDP_IP": ip, "UDP_PORT": 7777, "N_PIXELS": 60,
+            "PROTOCOL": "chunked", "KEYFRAME_INTERVAL": 30, "SKIP_THRESHOLD": 0, "REFRESH_INTERVAL": 60.0}
+
+
+def make_group(output):
+    configs = [board_config("10.0.0.1"), board_config("10.0.0.2")]
+    members = [devices.ESP8266(ip=c["UDP_IP"], port=c["UDP_PORT"], leds=c["N_PIXELS"], protocol=c["PROTOCOL"],
+                               skip_threshold=c["SKIP_THRESHOLD"], refresh_interval=c["REFRESH_INTERVAL"],
+                               output=output)
+               for c in configs]
+    return devices.MulticastGroup("239.255.0.1", configs, members, output), members
+
+
+def test_group_resends_after_members_were_shown_one_by_one():
+    output = RecordingOutput()
+    group, members = make_group(output)
+    frame = np.full((3, 60), 200.0)
+    other = np.full((3, 60), 50.0)
+
+    # Sync on, the frame goes to the group once
+    assert group.show(frame)
+    assert [address for address, _ in output.sent] == [group.address]
+
+    # Sync off, every member is sent its own frame, as main does without sync
+    output.sent.clear()
+    for member in members:
+        member.show(other)
+    group.forget()
+    assert sorted(address for address, _ in output.sent) == [("10.0.0.1", 7777), ("10.0.0.2", 7777)]
+
+    # Sync back on with the frame the group sent last, it is sent again rather than skipped
+    output.sent.clear()
+    assert group.show(frame)
+    assert [address for address, _ in output.sent] == [group.address]
+    assert group.esp.skipped == 0
+
+
+def test_group_falls_back_to_members_when_their_colours_differ():
+    output = RecordingOutput()
+    group, members = make_group(output)
+    frame = np.full((3, 60), 200.0)
+    assert group.show(frame)
+
+    members[1].lut.update(brightness=0.5)
+    assert not group.show(frame)
+    assert group.unicast == 1
+
+    members[1].lut.update()
+    output.sent.clear()
+    assert group.show(frame)
+    assert [address for address, _ in output.sent] == [group.address]
@@ -0,0 +1,86 @@
+import time
+import numpy as np
+import lib.devices as devices
+import lib.opc as opc
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+def frame(value, leds):
+    return np.full((3, leds), float(value))
+
+
+def test_fadecandy_boards_share_one_connection_and_write():
+    sink = opc.Sink().start()
+    server = "127.0.0.1:{}".format(sink.port)
+    boards = [devices.Fadecandy(server, channel, leds=64) for channel in (1, 2)]
+    connection = opc.connection(server)
+    # The first frame only starts connecting
+    for board in boards:
+        board.show(frame(1, 64))
+    assert wait_for(lambda: connection._sock is not None)
+    for value in range(2, 6):
+        for board in boards:
+            board.show(frame(value, 64))
+        opc.flush()
+    assert wait_for(lambda: sink.messages == 8)
+    assert sink.connections == 1
+    assert connection.frames == 4
+    assert sink.channels[1] == sink.channels[2] == bytes([5]) * 3 * 64
+
+
+def test_frame_goes_out_when_a_board_skipped_it():
+    sink = opc.Sink().start()
+    server = "127.0.0.1:{}".format(sink.port)
+    boards = [devices.Fadecandy(server, channel, leds=10) for channel in (1, 2)]
+    # Connecting starts with the first write, the frame it was for is dropped
+    boards[0].show(frame(0, 10))
+    opc.flush()
+    assert wait_for(lambda: opc.connection(server)._sock is not None)
+    boards[0].show(frame(1, 10))
+    boards[1].show(frame(2, 10))
+    # Board 1 repeats its last frame, so only board 2 queues anything
+    boards[0].show(frame(1, 10))
+    boards[1].show(frame(3, 10))
+    opc.flush()
+    assert wait_for(lambda: sink.channels.get(2) == bytes([3]) * 30)
+    assert sink.channels[1] == bytes([1]) * 30
+
+
+def test_reconnects_after_the_server_drops_the_connection(monkeypatch):
+    monkeypatch.setattr(opc, "RECONNECT_INTERVAL", 0.01)
+    sink = opc.Sink().start()
+    server = "127.0.0.1:{}".format(sink.port)
+    board = devices.Fadecandy(server, 0, leds=10)
+    connection = opc.connection(server)
+    value = 0
+
+    def show():
+        nonlocal value
+        value += 1
+        board.show(frame(value, 10))
+        opc.flush()
+
+    assert wait_for(lambda: show() or sink.messages > 0)
+    sink.disconnect()
+    assert wait_for(lambda: show() or sink.connections == 2)
+    received = sink.messages
+    assert wait_for(lambda: show() or sink.messages > received)
+    assert connection.failures >= 1
+
+
+def test_unreachable_server_does_not_block_show():
+    board = devices.Fadecandy("127.0.0.1:1", 0, leds=10)
+    start = time.perf_counter()
+    for value in range(20):
+        board.show(frame(value, 10))
+        opc.flush()
+    assert time.perf_counter() - start < opc.CONNECT_TIMEOUT
+    assert wait_for(lambda: opc.connection("127.0.0.1:1").failures >= 1)
@@ -0,0 +1,153 @@
+import socket
+import threading
+import time
+import pytest
+from lib.output import OutputBatch, OutputEngine
+
+
+class Listener():
+    """Local UDP socket that records every datagram with its arrival time"""
+    def __init__(self, host="127.0.0.1"):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, 0))
+        self.address = self.sock.getsockname()
+        self.received = []      # (arrival time, datagram)
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self):
+        while True:
+            packet = self.sock.recv(2048)
+            self.received.append((time.monotonic(), packet))
+
+    def packets(self):
+        return [packet for _, packet in self.received]
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.002)
+    return True
+
+
+@pytest.mark.parametrize("use_sendmmsg", [True, False])
+def test_batch_sends_everything_in_order(use_sendmmsg):
+    listeners = [Listener() for i in range(3)]
+    batch = OutputBatch(use_sendmmsg=use_sendmmsg)
+    for frame in range(3):
+        for i, listener in enumerate(listeners):
+            batch.add([b"%d-%d-%d" % (frame, i, n) for n in range(4)], listener.address)
+        assert batch.flush() == 12
+    assert wait_for(lambda: all(len(listener.received) == 12 for listener in listeners))
+    for i, listener in enumerate(listeners):
+        assert listener.packets() == [b"%d-%d-%d" % (frame, i, n) for frame in range(3) for n in range(4)]
+    assert batch.packets == 36
+    assert batch.errors == 0
+    if use_sendmmsg and batch._sendmmsg is not None:
+        # One system call for every flush
+        assert batch.calls == 3
+
+
+@pytest.mark.parametrize("use_sendmmsg", [True, False])
+def test_batch_carries_on_past_a_failed_destination(use_sendmmsg):
+    listener = Listener()
+    batch = OutputBatch(use_sendmmsg=use_sendmmsg)
+    batch.add([b"a"], listener.address)
+    # A name that never resolves, and a broadcast the socket isn't allowed to send
+    batch.add([b"x"], ("host.invalid", 9))
+    batch.add([b"b"], listener.address)
+    batch.add([b"y"], ("255.255.255.255", 9))
+    batch.add([b"c"], listener.address)
+    assert batch.flush() == 3
+    assert batch.errors == 2
+    assert wait_for(lambda: len(listener.received) == 3)
+    assert listener.packets() == [b"a", b"b", b"c"]
+
+
+def test_batch_larger_than_one_sendmmsg_call():
+    listener = Listener()
+    listener.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 22)
+    batch = OutputBatch()
+    batch.add([b"%d" % n for n in range(1500)], listener.address)
+    assert batch.flush() == 1500
+    assert wait_for(lambda: len(listener.received) == 1500)
+    assert listener.packets() == [b"%d" % n for n in range(1500)]
+
+
+def test_engine_sends_every_frame_when_not_paced():
+    listener = Listener()
+    engine = OutputEngine()
+    try:
+        for frame in range(5):
+            engine.add([b"%d-a" % frame, b"%d-b" % frame], listener.address)
+            engine.flush()
+            time.sleep(0.01)
+        assert wait_for(lambda: len(listener.received) == 10)
+        assert listener.packets() == [b"%d-%s" % (frame, part) for frame in range(5) for part in (b"a", b"b")]
+    finally:
+        engine.close()
+
+
+def test_engine_pacing_keeps_the_newest_frame():
+    listener = Listener()
+    engine = OutputEngine()
+    interval = 0.05
+    engine.pace(listener.address, interval)
+    try:
+        frames = 0
+        start = time.monotonic()
+        while time.monotonic() - start < 0.4:
+            engine.add([b"%d" % frames], listener.address)
+            engine.flush()
+            frames += 1
+            time.sleep(0.005)
+        last = b"%d" % (frames - 1)
+        assert wait_for(lambda: listener.received and listener.received[-1][1] == last)
+        times = [arrival for arrival, _ in listener.received]
+        # Frames faster than the pacing were replaced by newer ones, not queued behind them
+        assert len(times) <= 0.4 / interval + 2
+        assert engine.stats()[listener.address]["dropped"] >= frames - len(times) - 1
+        gaps = [b - a for a, b in zip(times, times[1:])]
+        assert min(gaps) >= interval * 0.8
+        sent = [int(packet) for packet in listener.packets()]
+        assert sent == sorted(sent)
+    finally:
+        engine.close()
+
+
+def test_engine_staggers_devices():
+    listeners = [Listener() for i in range(2)]
+    engine = OutputEngine(stagger=0.04)
+    try:
+        for frame in range(6):
+            for listener in listeners:
+                engine.add([b"%d" % frame], listener.address)
+            engine.flush()
+            time.sleep(0.04)
+        assert wait_for(lambda: all(len(listener.received) >= 5 for listener in listeners))
+        # The second device's turn comes half the stagger after the first's
+        gaps = [second[0] - first[0] for first, second in zip(listeners[0].received[1:], listeners[1].received[1:])]
+        assert sorted(gaps)[len(gaps) // 2] >= 0.01
+    finally:
+        engine.close()
+
+
+def test_engine_key_keeps_packets_to_several_addresses_in_order():
+    # One socket takes what is sent to any loopback address, so it sees the order they were sent in
+    listener = Listener("0.0.0.0")
+    addresses = [("127.0.0.%d" % i, listener.address[1]) for i in (1, 2, 3)]
+    engine = OutputEngine(stagger=0.03)
+    try:
+        for frame in range(3):
+            for i, address in enumerate(addresses):
+                engine.add([b"%d-%d" % (frame, i)], address, key="board")
+            engine.flush()
+            time.sleep(0.02)
+        assert wait_for(lambda: len(listener.received) == 9)
+        # One device under the key, so one turn for all three addresses and they go in the order added
+        assert list(engine.stats()) == ["board"]
+        assert listener.packets() == [b"%d-%d" % (frame, i) for frame in range(3) for i in range(3)]
+    finally:
+        engine.close()
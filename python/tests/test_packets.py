@@ -0,0 +1,209 @@
+import numpy as np
+import lib.devices as devices
+import lib.packets as packets
+from lib.clock import now_us
+from lib.receiver import Receiver
+
+
+class RecordingOutput():
+    """Output stage that keeps the packets of every frame"""
+    def __init__(self):
+        self.frames = []
+
+    def add(self, packets, address, key=None):
+        if packets:
+            self.frames.append([bytes(packet) for packet in packets])
+
+
+def timed_esp(protocol, leds, output):
+    esp = devices.ESP8266(ip="127.0.0.1", leds=leds, port=9, protocol=protocol, output=output, timed=True)
+    # A clock reading with no round trip, so frames are stamped from the first one
+    now = now_us()
+    esp._clock.pong(packets.clock_packet(packets.TYPE_PONG, now, now), now=now)
+    return esp
+
+
+def test_timed_packets_fit_the_firmware_buffer():
+    rng = np.random.default_rng(1)
+    frames = [rng.uniform(0, 255, (3, 1000)),
+              np.repeat(rng.uniform(0, 255, (3, 8)), 125, axis=1),
+              np.tile(rng.uniform(0, 255, (3, 200)), 5)]
+    for protocol in ("chunked", "compressed", "delta"):
+        output = RecordingOutput()
+        esp = timed_esp(protocol, 1000, output)
+        receiver = Receiver(1000, clock=lambda: 0)
+        for pixels in frames + frames:
+            esp.show(pixels, present=0.0)
+        assert len(output.frames) == 2 * len(frames)
+        for frame in output.frames:
+            for packet in frame:
+                assert packet[1] & packets.FLAG_TIMED
+                assert len(packet) <= packets.MAX_PAYLOAD
+                receiver.receive(packet, now=0)
+        assert receiver.invalid == 0
+        assert receiver.incomplete == 0
+
+
+def test_receiver_drops_headed_packets_over_the_firmware_buffer():
+    receiver = Receiver(1000)
+    rgb = bytes(range(256)) * 6
+    packet = packets.chunk_frame(rgb[:3 * 500], 0, max_payload=packets.MAX_PAYLOAD + 30)[0]
+    assert len(packet) > packets.MAX_PAYLOAD
+    assert not receiver.receive(packet)
+    assert receiver.invalid == 1
+
+
+def random_leds(n, seed=0):
+    return np.random.default_rng(seed).integers(0, 256, (n, 3), dtype=np.uint8)
+
+
+def receive_all(receiver, frame_packets, now=0):
+    """Hand a frame's packets to receiver, returns how many of them completed a frame"""
+    return sum(bool(receiver.receive(packet, now=now)) for packet in frame_packets)
+
+
+def assert_headed(frame_packets, max_payload=packets.MAX_PAYLOAD):
+    for packet in frame_packets:
+        assert packet[0] == packets.MAGIC
+        assert len(packet) <= max_payload
+        # Never mistaken for a raw frame
+        assert len(packet) % 3 != 0
+
+
+def test_chunked_round_trip_at_the_chunk_boundary():
+    per_packet = (packets.MAX_PAYLOAD - packets.HEADER.size) // 3
+    for n in (1, per_packet - 1, per_packet, per_packet + 1, 2 * per_packet, 2 * per_packet + 1):
+        leds = random_leds(n, n)
+        frame_packets = packets.chunk_frame(leds.tobytes(), 7)
+        assert len(frame_packets) == -(-n // per_packet)
+        assert_headed(frame_packets)
+        # Full chunks fill the packet up to the byte
+        if n >= per_packet:
+            assert len(frame_packets[0]) == packets.HEADER.size + 3 * per_packet
+        assert [packet[1] & packets.FLAG_LAST for packet in frame_packets] == [0] * (len(frame_packets) - 1) + [packets.FLAG_LAST]
+        receiver = Receiver(n)
+        assert receive_all(receiver, frame_packets) == 1
+        assert np.array_equal(receiver.shown, leds)
+        assert receiver.invalid == receiver.incomplete == 0
+
+
+def test_chunked_frame_missing_a_packet_is_not_shown():
+    leds = random_leds(1200)
+    frame_packets = packets.chunk_frame(leds.tobytes(), 1)
+    receiver = Receiver(1200)
+    assert receive_all(receiver, frame_packets[:1] + frame_packets[2:]) == 0
+    assert receiver.frames == 0
+    assert receiver.incomplete == 1
+    # The next whole frame is shown
+    assert receive_all(receiver, packets.chunk_frame(leds.tobytes(), 2)) == 1
+
+
+def test_raw_frame_and_headed_packet_sizes():
+    receiver = Receiver(100)
+    leds = random_leds(100)
+    assert receiver.receive(leds.tobytes(), now=0)
+    assert np.array_equal(receiver.shown, leds)
+    # An RGB payload that isn't count LEDs long is malformed
+    packet = packets.header(packets.TYPE_RGB, 0, 0, 10, True) + leds[:9].tobytes()
+    assert not receiver.receive(packet, now=0)
+    # As is one past the end of the strip
+    packet = packets.header(packets.TYPE_RGB, 0, 95, 10, True) + leds[:10].tobytes()
+    assert not receiver.receive(packet, now=0)
+    assert receiver.invalid == 2
+
+
+def test_delta_round_trip_with_keyframes():
+    output = RecordingOutput()
+    esp = devices.ESP8266(ip="127.0.0.1", leds=600, port=9, protocol="delta", keyframe_interval=4, output=output)
+    receiver = Receiver(600)
+    rng = np.random.default_rng(2)
+    pixels = rng.integers(0, 256, (3, 600)).astype(float)
+    kinds = []
+    for i in range(12):
+        # A few scattered LEDs and one run longer than MAX_RUN change every frame
+        pixels[:, rng.integers(0, 600, 5)] = rng.integers(0, 256, (3, 5))
+        pixels[:, 100:400] = i * 20
+        esp.show(pixels)
+        frame_packets = output.frames[-1]
+        assert_headed(frame_packets)
+        kinds.append(frame_packets[0][1] & packets.TYPE_MASK)
+        assert receive_all(receiver, frame_packets) == 1
+        assert np.array_equal(receiver.pixels(), pixels.astype(np.uint8))
+    # The first frame and every 5th after it are whole, the rest only the changes
+    assert [kind != packets.TYPE_DELTA for kind in kinds] == [i % 5 == 0 for i in range(12)]
+    assert receiver.invalid == receiver.incomplete == 0
+
+
+def test_delta_runs_split_at_packet_boundaries():
+    previous = random_leds(3000, 3)
+    leds = previous.copy()
+    # Every other LED changes, so runs stop at each one, plus a run that needs several packets
+    leds[:1000:2] ^= 0xFF
+    leds[1000:2600] ^= 0xFF
+    starts, stops = packets.changed_runs(leds, previous, gap=0)
+    frame_packets = packets.delta_frame(leds, starts, stops, 5)
+    assert len(frame_packets) > 1
+    assert_headed(frame_packets)
+    receiver = Receiver(3000)
+    receiver.leds[:] = previous
+    assert receive_all(receiver, frame_packets) == 1
+    assert np.array_equal(receiver.shown, leds)
+
+
+def test_delta_run_outside_its_packet_is_invalid():
+    receiver = Receiver(100)
+    run = packets.RUN.pack(50, 2) + bytes(6)
+    assert not receiver.receive(packets.header(packets.TYPE_DELTA, 0, 0, 40, True) + run, now=0)
+    assert receiver.invalid == 1
+
+
+def test_rle_round_trip_with_long_runs():
+    colours = random_leds(6, 4)
+    # Runs longer than MAX_RUN are split, and enough runs to need a second packet
+    lengths = [1, 700, 3, 256, 255] + [2] * 600
+    leds = np.repeat(colours[np.arange(len(lengths)) % 6], lengths, axis=0)
+    frame_packets = packets.rle_frame(leds, packets.identical_runs(leds), 9)
+    assert len(frame_packets) > 1
+    assert all(packet[1] & packets.TYPE_MASK == packets.TYPE_RLE for packet in frame_packets)
+    assert_headed(frame_packets)
+    receiver = Receiver(len(leds))
+    assert receive_all(receiver, frame_packets) == 1
+    assert np.array_equal(receiver.shown, leds)
+
+
+def test_palette_round_trip_and_padding():
+    colours = random_leds(5, 5)
+    for n in range(1, 40):
+        leds = colours[np.arange(n) % 5]
+        frame_packets = packets.palette_frame(*packets.palette(leds), 3)
+        assert_headed(frame_packets)
+        receiver = Receiver(n)
+        assert receive_all(receiver, frame_packets) == 1
+        assert np.array_equal(receiver.shown, leds)
+    # A palette frame too long for one packet repeats the palette in each
+    leds = colours[np.arange(3000) % 5]
+    frame_packets = packets.palette_frame(*packets.palette(leds), 3)
+    assert len(frame_packets) == 3
+    receiver = Receiver(3000)
+    assert receive_all(receiver, frame_packets) == 1
+    assert np.array_equal(receiver.shown, leds)
+
+
+def test_compression_picks_the_smallest_encoding():
+    runs = np.repeat(random_leds(4, 6), 250, axis=0)
+    few_colours = random_leds(10, 7)[np.random.default_rng(8).integers(0, 10, 1000)]
+    noise = random_leds(1000, 9)
+    for leds, kind in ((runs, packets.TYPE_RLE), (few_colours, packets.TYPE_PALETTE), (noise, packets.TYPE_RGB)):
+        frame_packets = packets.compress_frame(leds, 1)
+        assert frame_packets[0][1] & packets.TYPE_MASK == kind
+        assert_headed(frame_packets)
+        receiver = Receiver(1000)
+        assert receive_all(receiver, frame_packets) == 1
+        assert np.array_equal(receiver.shown, leds)
+
+
+def test_palette_index_past_the_palette_is_invalid():
+    receiver = Receiver(10)
+    packet = packets.pad(packets.header(packets.TYPE_PALETTE, 0, 0, 2, True) + bytes([1, 1, 2, 3, 0, 1]))
+    assert not receiver.receive(packet, now=0)
+    assert receiver.invalid == 1
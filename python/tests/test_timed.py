@@ -0,0 +1,112 @@
+import numpy as np
+import lib.packets as packets
+from lib.clock import ClockOffset
+from lib.receiver import Receiver
+
+N_PIXELS = 600
+
+
+def timed_frame(seq, pts, value=None):
+    """Packets of a timed chunked frame, every LED set to value, seq by default"""
+    value = seq & 0xFF if value is None else value
+    rgb = bytes([value]) * 3 * N_PIXELS
+    return packets.stamp(packets.chunk_frame(rgb, seq, packets.MAX_PAYLOAD - packets.TIMED.size), seq, pts)
+
+
+def send(receiver, frame_packets, now):
+    return sum(bool(receiver.receive(packet, now=now)) for packet in frame_packets)
+
+
+def showing(receiver):
+    return int(receiver.shown[0, 0])
+
+
+def test_timed_frames_are_held_until_due():
+    receiver = Receiver(N_PIXELS)
+    assert send(receiver, timed_frame(1, 1000), now=0) == 0
+    assert send(receiver, timed_frame(2, 2000), now=10) == 0
+    assert receiver.frames == 0
+    assert receiver.until_due(now=500) == 500 / 1e6
+    assert receiver.poll(now=1000)
+    assert showing(receiver) == 1
+    # Both due by now, only the newest is shown
+    assert send(receiver, timed_frame(3, 3000), now=1500) == 0
+    assert receiver.poll(now=3500)
+    assert showing(receiver) == 3
+    assert receiver.replaced == 1
+    assert receiver.late == 0
+
+
+def test_frame_due_on_arrival_is_late_and_shown_straight_away():
+    receiver = Receiver(N_PIXELS)
+    send(receiver, timed_frame(1, 5000), now=0)
+    # Due exactly now counts as late, like queue_frame in the firmware
+    assert send(receiver, timed_frame(2, 1000), now=1000) == 1
+    assert showing(receiver) == 2
+    assert receiver.late == 1
+    # The older frame still waiting is dropped with it
+    assert not receiver.poll(now=6000)
+    assert receiver.replaced == 1
+
+
+def test_stale_and_repeated_frames_are_dropped():
+    receiver = Receiver(N_PIXELS)
+    send(receiver, timed_frame(10, 0), now=0)
+    assert showing(receiver) == 10
+    for seq in (10, 9, 10 - 0x7FFF):
+        assert send(receiver, timed_frame(seq, 0), now=0) == 0
+    assert showing(receiver) == 10
+    assert receiver.stale == 3 * len(timed_frame(0, 0))
+    assert send(receiver, timed_frame(11, 0), now=0) == 1
+
+
+def test_sequence_numbers_wrap_around():
+    receiver = Receiver(N_PIXELS)
+    for seq in (0xFFFE, 0xFFFF, 0, 1):
+        assert send(receiver, timed_frame(seq, 0), now=0) == 1
+        assert showing(receiver) == seq & 0xFF
+    # Half the sequence space behind counts as old, not as far ahead
+    assert send(receiver, timed_frame(0x8001, 0), now=0) == 0
+    assert receiver.stale > 0
+
+
+def test_receiver_follows_a_restarted_sender():
+    receiver = Receiver(N_PIXELS)
+    send(receiver, timed_frame(30000, 0), now=0)
+    shown = [send(receiver, timed_frame(seq, 0), now=0) for seq in range(1, 20)]
+    assert shown == [0] * Receiver.MAX_STALE + [1] * (19 - Receiver.MAX_STALE)
+    assert showing(receiver) == 19
+
+
+def test_stray_datagrams_are_not_counted_as_stale():
+    receiver = Receiver(N_PIXELS)
+    send(receiver, timed_frame(100, 0), now=0)
+    stray = bytes([0x00, packets.FLAG_TIMED | packets.FLAG_LAST]) + bytes(20)
+    for i in range(2 * Receiver.MAX_STALE):
+        assert not receiver.receive(stray, now=0)
+    assert receiver.stale == 0
+    assert receiver.invalid == 2 * Receiver.MAX_STALE
+    # Still holding on to the sender's numbering
+    assert send(receiver, timed_frame(50, 0), now=0) == 0
+
+
+def test_pts_wraps_around_the_32_bit_clock():
+    receiver = Receiver(N_PIXELS)
+    now = 0xFFFFFF00
+    assert send(receiver, timed_frame(1, (now + 0x200) & 0xFFFFFFFF), now=now) == 0
+    assert not receiver.poll(now=now + 0x100)
+    assert receiver.poll(now=(now + 0x200) & 0xFFFFFFFF)
+
+
+def test_ping_pong_gives_the_clock_offset():
+    receiver = Receiver(N_PIXELS, clock=lambda: 5000)
+    clock = ClockOffset()
+    ping = packets.clock_packet(packets.TYPE_PING, 1000)
+    assert len(ping) % 3 != 0
+    pong = receiver.reply(ping)
+    assert pong is not None and receiver.reply(pong) is None
+    assert clock.pong(pong, now=1200)
+    # Half the 200 us round trip is taken as the way there
+    assert clock.rtt == 200
+    assert clock.offset == 5000 - 1100
+    assert clock.to_receiver(1100) == 5000
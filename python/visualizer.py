@@ -2,6 +2,7 @@ from collections import deque
 import numpy as np
 import config as config
 import time
+from lib.gradient import ScrollingGradient, easing_gradient
 
 class Visualizer():
     def __init__(self, board):
@@ -90,7 +91,11 @@ class Visualizer():
         self.freq_channel_history = 40
         self.beat_count = 0
        
-        self.freq_channels = [deque(maxlen=self.freq_channel_history) for i in range(config.settings["devices"][self.board.board]["configuration"]["N_FFT_BINS"])]
+        # Rolling (history x bins) window of mel values, newest row at freq_pos, with a running sum for each bin
+        self.freq_channels = np.zeros((self.freq_channel_history, config.settings["devices"][self.board.board]["configuration"]["N_FFT_BINS"]))
+        self.freq_sums = np.zeros(config.settings["devices"][self.board.board]["configuration"]["N_FFT_BINS"])
+        self.freq_pos = -1
+        self.freq_count = 0
         self.prev_output = np.array([[0 for i in range(config.settings["devices"][self.board.board]["configuration"]["N_PIXELS"])] for i in range(3)])
         self.output = np.array([[0 for i in range(config.settings["devices"][self.board.board]["configuration"]["N_PIXELS"])] for i in range(3)])
         self.prev_spectrum = np.array([config.settings["devices"][self.board.board]["configuration"]["N_PIXELS"] // 2])
@@ -240,69 +245,18 @@ class Visualizer():
         # Setup for multicolour modes (don't mess with this either unless you want to add in your own multicolour modes)
         # If there's a multicolour mode you would like to see, let me know on GitHub! 
 
-        #def _vect_easing_func_gen(slope=2.5, length=1):
-        #    return np.vectorize(_easing_func)
-
-        def _easing_func(x, length, slope=2.5):
-            # returns a nice eased curve with defined length and curve
-            xa = (x/length)**slope
-            return xa / (xa + (1 - (x/length))**slope)
-
-
-        def _easing_gradient_generator(colors, length):
-            """
-            returns np.array of given length that eases between specified colours
-
-            parameters:
-            colors - list, colours must be in config.settings["colors"]
-                eg. ["Red", "Orange", "Blue", "Purple"]
-            length - int, length of array to return. should be from config.settings
-                eg. config.settings["devices"]["my strip"]["configuration"]["N_PIXELS"]
-            """
-            colors = colors[::-1] # needs to be reversed, makes it easier to deal with
-            n_transitions = len(colors) - 1
-            ease_length = length // n_transitions
-            pad = length - (n_transitions * ease_length)
-            output = np.zeros((3, length))
-            ease = np.array([_easing_func(i, ease_length, slope=2.5) for i in range(ease_length)])
-            # for r,g,b
-            for i in range(3):
-                # for each transition
-                for j in range(n_transitions):
-                    # Starting ease value
-                    start_value = config.settings["colors"][colors[j]][i]
-                    # Ending ease value
-                    end_value = config.settings["colors"][colors[j+1]][i]
-                    # Difference between start and end
-                    diff = end_value - start_value
-                    # Make array of all start value
-                    base = np.empty(ease_length)
-                    base.fill(start_value)
-                    # Make array of the difference between start and end
-                    diffs = np.empty(ease_length)
-                    diffs.fill(diff)
-                    # run diffs through easing function to make smooth curve
-                    eased_diffs = diffs * ease
-                    # add transition to base values to produce curve from start to end value
-                    base += eased_diffs
-                    # append this to the output array
-                    output[i, j*ease_length:(j+1)*ease_length] = base
-            # cast to int
-            output = np.asarray(output, dtype=int)
-            # pad out the ends (bit messy but it works and looks good)
-            if pad:
-                for i in range(3):
-                    output[i, -pad:] = output[i, -pad-1]
-            return output
-
+        # Generated gradients are cached per process (and optionally on disk), so boards with the same
+        # number of pixels share one read only array
         self.multicolor_modes = {}
         for gradient in config.settings["gradients"]:
-            self.multicolor_modes[gradient] = _easing_gradient_generator(config.settings["gradients"][gradient],
-                                                                         config.settings["devices"][self.board.board]["configuration"]["N_PIXELS"])
+            self.multicolor_modes[gradient] = easing_gradient([config.settings["colors"][color] for color in config.settings["gradients"][gradient]],
+                                                              config.settings["devices"][self.board.board]["configuration"]["N_PIXELS"],
+                                                              cache_dir=config.settings["configuration"]["GRADIENT_CACHE_DIR"])
 
+        # Effects that scroll a gradient read it through these, each with its own scroll position
+        self.gradients = {}
         for i in self.multicolor_modes:
-            self.multicolor_modes[i] = np.concatenate((self.multicolor_modes[i][:, ::-1],
-                                                       self.multicolor_modes[i]), axis=1)
+            self.gradients[i] = ScrollingGradient(self.multicolor_modes[i])
 
     def get_vis(self, y, audio_input):
    
@@ -333,36 +287,43 @@ class Visualizer():
 
         return self.prev_output
 
+    def frame_interval(self):
+        """Seconds the current effect wants between frames"""
+        currentEffect = self.board.config["current_effect"]
+        return self.board.effectConfig.get(currentEffect, {}).get("delay", self.effects[currentEffect].delay)
+
     def _split_equal(self, value, parts):
         value = float(value)
         return [int(round(i*value/parts)) for i in range(1,parts+1)]
 
     def update_freq_channels(self, y):
-        for i in range(len(y)):
-            self.freq_channels[i].appendleft(y[i])
+        pos = (self.freq_pos + 1) % self.freq_channel_history
+        self.freq_sums -= self.freq_channels[pos]
+        self.freq_channels[pos] = y
+        self.freq_sums += y
+        self.freq_pos = pos
+        self.freq_count = min(self.freq_count + 1, self.freq_channel_history)
+        # Recompute the sums once per lap so floating point drift can't build up
+        if pos == self.freq_channel_history - 1:
+            np.sum(self.freq_channels, axis=0, out=self.freq_sums)
 
     def detect_freqs(self):
         """
         Function that updates current_freq_detects. Any visualisation algorithm can check if
         there is currently a beat, low, mid, or high by querying the self.current_freq_detects dict.
         """
-        channel_avgs = []
-        differences = []
-        for i in range(config.settings["devices"][self.board.board]["configuration"]["N_FFT_BINS"]):
-            channel_avgs.append(sum(self.freq_channels[i])/len(self.freq_channels[i]))
-            differences.append(((self.freq_channels[i][0]-channel_avgs[i])*100)//channel_avgs[i])
+        latest = self.freq_channels[self.freq_pos]
+        channel_avgs = self.freq_sums / self.freq_count
+        with np.errstate(divide="ignore", invalid="ignore"):
+            differences = ((latest - channel_avgs) * 100) // channel_avgs
         for i in ["beat", "low", "mid", "high"]:
-            if any(differences[j] >= self.min_percent_diff[i]\
-                   and self.freq_channels[j][0] >= self.min_detect_amplitude[i]\
-                            for j in range(*self.detection_ranges[i]))\
+            start, stop = self.detection_ranges[i]
+            if np.any((differences[start:stop] >= self.min_percent_diff[i])\
+                      & (latest[start:stop] >= self.min_detect_amplitude[i]))\
                         and (time.time() - self.prev_freq_detects[i] > 0.2)\
-                        and len(self.freq_channels[0]) == self.freq_channel_history:
+                        and self.freq_count == self.freq_channel_history:
                 self.prev_freq_detects[i] = time.time()
                 self.current_freq_detects[i] = True
                 #print(i)
             else:
-                self.current_freq_detects[i] = False    
-
-
-    
-
+                self.current_freq_detects[i] = False